@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from agent.router import reset_router_stats, router_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Print how new agent messages were routed (patterns, local classifier or LLM) and "
+        "the share answered without an LLM call, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(router_stats(), indent=2))
+        if options['reset']:
+            reset_router_stats()
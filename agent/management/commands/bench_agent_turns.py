@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from agent import services
+from agent.services import AgentService
+from core.models import User
+
+
+class SleepingChain:
+    """Stands in for the Gemini chain: answers after a fixed delay, like a slow LLM call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(self.latency)
+        return "Sure, here is a thought."
+
+    async def astream(self, inputs):
+        await asyncio.sleep(self.latency)
+        yield "Sure, here is a thought."
+
+
+class BenchComponents:
+    def __init__(self, latency):
+        self.llm = None
+        self.prompt = services.PROMPT
+        self.chain = SleepingChain(latency)
+        self.summary_chain = SleepingChain(latency)
+        self.tools = []  # conversational turns never reach a tool
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many agent turns one event loop serves concurrently: run --turns "
+        "conversational messages at once against the configured database and cache, with "
+        "the LLM replaced by a fixed --latency delay. Benchmark users are created and deleted "
+        "by the run; the router counters (agent_router_stats) include its turns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=100, help='Concurrent turns, one user each.')
+        parser.add_argument('--latency', type=float, default=0.5, help='Seconds the fake LLM takes per call.')
+
+    def handle(self, *args, **options):
+        tag = int(time.time())
+        users = User.objects.bulk_create([
+            User(username=f"bench_agent_{tag}_{i}", email=f"bench_agent_{tag}_{i}@example.com", password="!")
+            for i in range(options['turns'])
+        ])
+        previous, services._components = services._components, BenchComponents(options['latency'])
+        try:
+            elapsed = asyncio.run(self.run([user.id for user in users]))
+        finally:
+            services._components = previous
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        turns, latency = options['turns'], options['latency']
+        self.stdout.write(
+            f"{turns} turns with a {latency:g} s LLM in {elapsed:.2f} s "
+            f"({turns / elapsed:,.0f} turns/s; serially this would take {turns * latency:g} s)"
+        )
+
+    async def run(self, user_ids):
+        async def turn(user_id):
+            service = await AgentService.create(user_id)
+            await service.process_message("tell me something encouraging")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(turn(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - start
+        # Let background summary folds finish before the users are deleted
+        await asyncio.gather(*services._summary_tasks.values(), return_exceptions=True)
+        return elapsed
@@ -7,6 +7,15 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Rolling summary of every message up to and including summarized_up_to (a Message id);
+    # newer messages reach the LLM verbatim, see agent.services.MEMORY_WINDOW
+    summary = models.TextField(blank=True, default='')
+    summarized_up_to = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='conversation_active_idx'),
+        ]
     
     def __str__(self):
         return f"Conversation with {self.user.username}"
@@ -16,6 +25,11 @@ class Message(models.Model):
     content = models.TextField()
     is_user = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'id'], name='agent_message_conv_id_idx'),
+        ]
     
     def __str__(self):
         return f"{'User' if self.is_user else 'Agent'} message in conversation {self.conversation.id}"
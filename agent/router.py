@@ -0,0 +1,296 @@
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Any
+
+from django.core.cache import cache
+
+# Local intent routing: compiled patterns first, then a small naive Bayes classifier.
+# Only messages neither can place with confidence go to the LLM.
+CLASSIFIER_THRESHOLD = 0.8  # minimum posterior to act on the classifier's intent
+
+LLM_INTENT = 'chat'
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DAY_ALIASES = {
+    'mon': 'Monday', 'tue': 'Tuesday', 'tues': 'Tuesday', 'wed': 'Wednesday', 'thu': 'Thursday',
+    'thur': 'Thursday', 'thurs': 'Thursday', 'fri': 'Friday', 'sat': 'Saturday', 'sun': 'Sunday',
+    **{day.lower(): day for day in DAYS},
+    **{f"{day.lower()}s": day for day in DAYS},
+}
+DAY_GROUPS = {
+    'weekdays': DAYS[:5], 'weekday': DAYS[:5],
+    'weekends': DAYS[5:], 'weekend': DAYS[5:],
+    'daily': DAYS, 'everyday': DAYS, 'every day': DAYS,
+}
+
+CREATE_VERB = r'\b(?:add|create|make|schedule|set up|plan)\b'
+POLITE = r'^\s*(?:please\s+|(?:can|could|would|will)\s+you\s+(?:please\s+)?)?'
+NEW_THING = POLITE + r'new\s+'  # "new task ..." but not "show my new tasks"
+
+# Create commands are checked before the list patterns: "add swimming to my hobbies" is a create
+TASK_COMMAND = re.compile(CREATE_VERB + r'.*\btasks?\b|' + NEW_THING + r'tasks?\b', re.I)
+HOBBY_COMMAND = re.compile(
+    CREATE_VERB + r'.*\bhobb(?:y|ies)\b|\bhobb(?:y|ies)\b.*\b(?:add|create)\b|' + NEW_THING + r'hobb(?:y|ies)\b', re.I
+)
+CREATE_COMMAND = re.compile(POLITE + r'(?:' + CREATE_VERB + r'|\bnew\b)', re.I)  # imperative only, not "how should I plan..."
+
+# Lists only in imperative ("show me my tasks"), question ("what are my hobbies") or bare ("my tasks") form,
+# so "show me how to plan tasks" or "what's the point of hobbies?" stay with the LLM. The bare form must be
+# the whole message: "my tasks keep slipping, any advice?" is conversation.
+LIST_QUALIFIER = r'(?:(?:current|new|upcoming|pending)\s+)?'
+LIST_PREFIX = (
+    POLITE + r'(?:(?:show|list|view|display|see|get)(?:\s+me)?(?:\s+all)?(?:\s+(?:of\s+)?(?:my|the))?'
+    r'|(?:what|which)(?:\s+are|\'re|\'s|s)?\s+(?:all\s+)?my)\s+' + LIST_QUALIFIER
+)
+BARE_LIST = r'|^\s*my\s+' + LIST_QUALIFIER
+LIST_TASKS = re.compile(LIST_PREFIX + r'tasks?\b' + BARE_LIST + r'tasks?\s*[?.!]*$', re.I)
+LIST_HOBBIES = re.compile(LIST_PREFIX + r'hobb(?:y|ies)\b' + BARE_LIST + r'hobb(?:y|ies)\s*[?.!]*$', re.I)
+
+# Questions about the app are never create commands, and their words are never a task name
+QUESTION = re.compile(
+    r'^\s*(?:how|why|what|whats|when|where|which|who|is|are|am|do (?:i|you)|does|did|should|shall)\b'
+    r'|\bhow\s+(?:to|do|does|can|could|should|would)\b',
+    re.I,
+)
+
+DAY_PATTERN = re.compile(
+    r'\b(' + '|'.join(sorted(list(DAY_ALIASES) + list(DAY_GROUPS), key=len, reverse=True)) + r')\b', re.I
+)
+DURATION_PATTERN = re.compile(
+    r'\b(?:for\s+)?(?:(\d{1,2}):(\d{2})(?::(\d{2}))?(?!\s*(?:am|pm))'
+    r'|(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hour|hours)\b(?:\s*(\d+)\s*(?:m|min|mins|minute|minutes)\b)?'
+    r'|(\d+)\s*(?:m|min|mins|minute|minutes)\b)',
+    re.I,
+)
+TIME_PATTERN = re.compile(r'\b(?:at|@)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\b', re.I)
+PRIORITY_PATTERN = re.compile(r'\b(high|medium|low)\b(?:\s+priority)?|\bpriority\s+(high|medium|low)\b', re.I)
+CATEGORY_PATTERN = re.compile(r'\b(?:in|under|category|as)\s+(?:the\s+|a\s+|an\s+)?([\w][\w &-]*?)(?:\s+category)?\s*$', re.I)
+
+# Words that carry the command rather than the task or hobby name
+FILLER = re.compile(
+    r'\b(?:please|can you|could you|i want to|i need to|i\'d like to|remind me to|'
+    r'add|create|new|make|schedule|set up|plan|a|an|the|my|task|tasks|hobby|hobbies|'
+    r'on|every|for|at|to|priority|with|called|named|as|fixed|time)\b',
+    re.I,
+)
+
+TRAINING = {
+    'create_task': [
+        "add gym monday 1h high", "create a task to study for two hours", "new task call mom",
+        "remind me to do laundry on sunday", "schedule a meeting on friday at 3pm",
+        "i need to finish the report by wednesday", "put running on my schedule", "plan groceries saturday",
+        "set up a workout every weekday", "add task read book 30 min low priority",
+        "i have to clean the house this weekend", "book dentist appointment thursday",
+    ],
+    'create_hobby': [
+        "add hobby painting", "i started learning guitar", "i like photography", "i enjoy hiking on weekends",
+        "new hobby chess in games", "add cooking to my hobbies", "i love playing football",
+        "put reading in my interests", "i picked up knitting recently", "my new hobby is swimming",
+    ],
+    'list_tasks': [
+        "show my tasks", "list tasks", "what do i have to do", "what's on my schedule", "view my todo list",
+        "which tasks do i have", "what are my tasks today", "show me what i need to do",
+    ],
+    'list_hobbies': [
+        "show my hobbies", "list hobbies", "what are my hobbies", "which hobbies do i have",
+        "what do i like doing", "view my interests",
+    ],
+    LLM_INTENT: [
+        "hello", "hi there", "how are you", "thanks", "what can you do", "help me be more productive",
+        "how should i balance work and hobbies", "tell me a joke", "i feel tired today",
+        "any tips for staying focused", "why is sleep important", "good morning",
+        "what is the best time to exercise", "how do i stop procrastinating",
+    ],
+}
+
+
+@dataclass
+class Route:
+    intent: str
+    slots: Dict[str, Any] = field(default_factory=dict)
+    confidence: float = 1.0
+    source: str = 'rule'  # 'rule', 'classifier' or 'llm'
+
+
+def tokenize(text):
+    return re.findall(r"[a-z']+", text.lower())
+
+
+def features(text):
+    """Words plus markers for recognised slot types, so "add gym mon 1h" reads like any other task."""
+    tokens = tokenize(text)
+    if DAY_PATTERN.search(text):
+        tokens.append('<day>')
+    if DURATION_PATTERN.search(text):
+        tokens.append('<duration>')
+    if TIME_PATTERN.search(text):
+        tokens.append('<time>')
+    if PRIORITY_PATTERN.search(text):
+        tokens.append('<priority>')
+    return tokens
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes with Laplace smoothing; trains in microseconds on TRAINING."""
+
+    def __init__(self, examples):
+        self.word_counts = defaultdict(Counter)
+        self.class_counts = Counter()
+        for label, texts in examples.items():
+            for text in texts:
+                self.class_counts[label] += 1
+                self.word_counts[label].update(features(text))
+        self.vocabulary = set().union(*self.word_counts.values())
+        self.totals = {label: sum(counts.values()) for label, counts in self.word_counts.items()}
+        self.examples = sum(self.class_counts.values())
+
+    def predict(self, text):
+        """(label, posterior probability)."""
+        tokens = [token for token in features(text) if token in self.vocabulary]
+        scores = {}
+        for label in self.class_counts:
+            score = math.log(self.class_counts[label] / self.examples)
+            denominator = self.totals[label] + len(self.vocabulary)
+            for token in tokens:
+                score += math.log((self.word_counts[label][token] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / total
+
+
+classifier = NaiveBayesClassifier(TRAINING)
+
+
+def _format_duration(seconds):
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+def extract_task_slots(message):
+    """Fill whatever create_task fields the message states. Values match AgentService._parse_field."""
+    slots = {}
+    text = message
+
+    days = []
+    for match in DAY_PATTERN.finditer(text):
+        word = match.group(1).lower()
+        for day in DAY_GROUPS.get(word, [DAY_ALIASES.get(word)]):
+            if day and day not in days:
+                days.append(day)
+    if days:
+        slots['days_associated'] = sorted(days, key=DAYS.index)
+    text = DAY_PATTERN.sub(' ', text)
+
+    time_match = TIME_PATTERN.search(text)
+    if time_match:
+        hour, minute, meridiem = int(time_match.group(1)), int(time_match.group(2) or 0), time_match.group(3)
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem.lower() == 'pm' else 0)
+        if hour < 24 and minute < 60:
+            slots['is_fixed_time'] = True
+            slots['fixed_time_slot'] = f"{hour:02d}:{minute:02d}:00"
+            text = text[:time_match.start()] + ' ' + text[time_match.end():]
+
+    duration = DURATION_PATTERN.search(text)
+    if duration:
+        hh, mm, ss, hours, extra_minutes, minutes = duration.groups()
+        if hh is not None:
+            seconds = int(hh) * 3600 + int(mm) * 60 + int(ss or 0)
+        elif hours is not None:
+            seconds = int(float(hours) * 3600) + int(extra_minutes or 0) * 60
+        else:
+            seconds = int(minutes) * 60
+        if seconds:
+            slots['time_required'] = _format_duration(seconds)
+            text = text[:duration.start()] + ' ' + text[duration.end():]
+
+    priority = PRIORITY_PATTERN.search(text)
+    if priority:
+        slots['priority'] = (priority.group(1) or priority.group(2)).capitalize()
+        text = text[:priority.start()] + ' ' + text[priority.end():]
+
+    name = _clean_name(text)
+    if name and not QUESTION.search(message):
+        slots['task_name'] = name
+    return slots
+
+
+def extract_hobby_slots(message):
+    slots = {}
+    text = message
+    category = CATEGORY_PATTERN.search(text)
+    if category:
+        slots['category'] = category.group(1).strip().title()
+        text = text[:category.start()]
+    name = _clean_name(text)
+    if name and not QUESTION.search(message):
+        slots['name'] = name.title()
+    return slots
+
+
+def _clean_name(text):
+    text = FILLER.sub(' ', text)
+    return re.sub(r'[\s,.:;!?-]+', ' ', text).strip()
+
+
+def route_message(message: str) -> Route:
+    """Decide how to answer a message that does not continue an in-progress intent."""
+    if not QUESTION.search(message):
+        if HOBBY_COMMAND.search(message):
+            return Route('create_hobby', extract_hobby_slots(message))
+        if TASK_COMMAND.search(message):
+            return Route('create_task', extract_task_slots(message))
+        if CREATE_COMMAND.search(message):
+            # "add gym monday 1h high": a create verb plus a name and task details is a task;
+            # without a name ("add 5 minutes") it is more likely about something else
+            slots = extract_task_slots(message)
+            if 'task_name' in slots and set(slots) - {'task_name'}:
+                return Route('create_task', slots)
+    if LIST_HOBBIES.search(message):
+        return Route('list_hobbies')
+    if LIST_TASKS.search(message):
+        return Route('list_tasks')
+
+    intent, confidence = classifier.predict(message)
+    if intent == LLM_INTENT or confidence < CLASSIFIER_THRESHOLD:
+        return Route(LLM_INTENT, confidence=confidence, source='llm')
+    if intent == 'create_task':
+        slots = extract_task_slots(message)
+        if 'task_name' not in slots:
+            return Route(LLM_INTENT, confidence=confidence, source='llm')
+        return Route(intent, slots, confidence, 'classifier')
+    if intent == 'create_hobby':
+        return Route(intent, extract_hobby_slots(message), confidence, 'classifier')
+    return Route(intent, confidence=confidence, source='classifier')
+
+
+# Bypass counters: how many new messages were answered without the LLM
+ROUTE_SOURCES = ('rule', 'classifier', 'llm')
+
+
+def _counter_key(source):
+    return f"agent_router:{source}"
+
+
+async def record_route(route: Route):
+    key = _counter_key(route.source)
+    await cache.aadd(key, 0, None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, None)
+
+
+def router_stats():
+    counts = cache.get_many([_counter_key(source) for source in ROUTE_SOURCES])
+    stats = {source: counts.get(_counter_key(source), 0) for source in ROUTE_SOURCES}
+    total = sum(stats.values())
+    stats['total'] = total
+    stats['bypass_rate'] = round((total - stats['llm']) / total, 4) if total else None
+    return stats
+
+
+def reset_router_stats():
+    cache.delete_many([_counter_key(source) for source in ROUTE_SOURCES])
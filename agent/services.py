@@ -1,107 +1,317 @@
+import asyncio
 import re
+import threading
 from typing import List, Dict, Any
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from .router import record_route, route_message
 from .tools import CreateTaskTool, CreateHobbyTool, GetUserTasksTool, GetUserHobbiesTool
 from .models import Conversation, Message, AgentState
 from django.conf import settings
+from django.core.cache import cache
 import json
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, AIMessage
-from langchain.chains import ConversationChain
 from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.utils import timezone
 from django.utils.dateparse import parse_duration, parse_time
 
-class AgentService:
-    def __init__(self, user_id: int):
-        self.user_id = user_id
-        self.conversation = self._get_or_create_conversation()
-        self.agent_state = self._get_or_create_agent_state()
-        self.tools = [
-            CreateTaskTool(),
-            CreateHobbyTool(),
-            GetUserTasksTool(),
-            GetUserHobbiesTool()
-        ]
-        self.agent = self._create_agent()
-        
-        # Create a more specific prompt template
-        self.prompt = PromptTemplate(
-        input_variables=["history", "input"],
-        template="""You are a friendly task and hobby management assistant. Your main functions are:
-        1. Help users manage their tasks and hobbies
-        2. Create new tasks by collecting required information
-        3. Add new hobbies to users' profiles
-        4. Show existing tasks and hobbies
-        5. Answer questions about task and hobby management
-
-        When creating tasks, collect: task_name, time_required (HH:MM:SS), days_associated (comma-separated days), 
-        priority (High/Medium/Low), is_fixed_time (yes/no), and fixed_time_slot if needed.
-        
-        For hobbies: collect name and category.
-        
-        If the user's request isn't about tasks or hobbies, provide a helpful response and suggest task/hobby related actions.
-        
-        Current conversation state:
-        {history}
-        
-        User: {input}
-        Assistant:"""
-    )
-        
-        self.memory = ConversationBufferMemory()
-        self.conversation_chain = ConversationChain(
-            llm=self.agent,
-            memory=self.memory,
-            prompt=self.prompt,
-            verbose=True
-        )
-        
-    def _get_or_create_conversation(self) -> Conversation:
-        conversation, created = Conversation.objects.get_or_create(
-            user_id=self.user_id,
-            is_active=True
-        )
-        return conversation
-        
-    def _get_or_create_agent_state(self) -> AgentState:
-        state, created = AgentState.objects.get_or_create(
-            conversation=self.conversation
-        )
-        return state
-        
-    def _create_agent(self):
+AGENT_STATE_TTL = 60 * 60  # seconds a user's agent state stays cached between messages
+
+# Conversation memory: the LLM sees the rolling summary plus the last MEMORY_WINDOW
+# messages verbatim, so prompt size stays flat however long the conversation gets.
+MEMORY_WINDOW = 12       # messages (6 user/assistant turns) sent verbatim
+SUMMARY_BATCH = 8        # fold older messages into the summary once this many have piled up
+SUMMARY_MAX_FOLD = 40    # at most this many messages folded per summarization call
+MEMORY_MAX = MEMORY_WINDOW + SUMMARY_MAX_FOLD  # unfolded messages sent; only exceeded if folding keeps failing
+SUMMARY_MAX_CHARS = 2000
+
+PROMPT = PromptTemplate(
+    input_variables=["history", "input"],
+    template="""You are a friendly task and hobby management assistant. Your main functions are:
+    1. Help users manage their tasks and hobbies
+    2. Create new tasks by collecting required information
+    3. Add new hobbies to users' profiles
+    4. Show existing tasks and hobbies
+    5. Answer questions about task and hobby management
+
+    When creating tasks, collect: task_name, time_required (HH:MM:SS), days_associated (comma-separated days), 
+    priority (High/Medium/Low), is_fixed_time (yes/no), and fixed_time_slot if needed.
+    
+    For hobbies: collect name and category.
+    
+    If the user's request isn't about tasks or hobbies, provide a helpful response and suggest task/hobby related actions.
+    
+    Current conversation state:
+    {history}
+    
+    User: {input}
+    Assistant:"""
+)
+
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["summary", "new_lines"],
+    template="""Progressively summarize the conversation between a user and their task and hobby assistant,
+    adding onto the previous summary and returning a new summary. Keep facts the assistant will need later
+    (the user's goals, preferences, tasks and hobbies mentioned). Use at most 150 words.
+
+    Current summary:
+    {summary}
+
+    New lines of conversation:
+    {new_lines}
+
+    New summary:"""
+)
+
+GENERAL_FALLBACK = "I'm here to help with managing your tasks and hobbies. " + \
+    "You can ask me to:\n" + \
+    "- Create a new task\n" + \
+    "- Add a hobby\n" + \
+    "- Show your tasks\n" + \
+    "- Show your hobbies"
+
+
+def format_messages(messages) -> str:
+    return "\n".join(f"{'User' if m.is_user else 'Assistant'}: {m.content}" for m in messages)
+
+
+class AgentComponents:
+    """
+    The user-independent parts of the agent: LLM client, prompt, chain and
+    tools. Built once per worker process and shared by every request; none
+    of them hold per-user state.
+    """
+
+    def __init__(self):
         if not settings.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not configured in settings.py")
-        
-        return ChatGoogleGenerativeAI(
+
+        self.llm = ChatGoogleGenerativeAI(
             model="models/gemini-1.5-pro-latest",
             google_api_key=settings.GEMINI_API_KEY,
             temperature=0.7
         )
-        
-    def process_message(self, message: str) -> str:
+        self.prompt = PROMPT
+        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.summary_chain = SUMMARY_PROMPT | self.llm | StrOutputParser()
+        self.tools = [
+            CreateTaskTool(),
+            CreateHobbyTool(),
+            GetUserTasksTool(),
+            GetUserHobbiesTool()
+        ]
+
+
+_components = None
+_components_lock = threading.Lock()
+
+
+def get_agent_components() -> AgentComponents:
+    global _components
+    if _components is None:
+        with _components_lock:
+            if _components is None:
+                _components = AgentComponents()
+    return _components
+
+
+# Background summary folds by conversation id
+_summary_tasks = {}
+
+
+def _agent_state_key(user_id):
+    return f"agent_state:{user_id}"
+
+
+async def load_agent_state(user_id: int) -> AgentState:
+    """
+    The user's AgentState for their active conversation, from the cache when
+    possible. Falls back to the database and creates the conversation and
+    state rows on first use.
+    """
+    row = await cache.aget(_agent_state_key(user_id))
+    if row is not None:
+        return AgentState(**row)
+
+    conversation, created = await Conversation.objects.aget_or_create(user_id=user_id, is_active=True)
+    state, created = await AgentState.objects.aget_or_create(conversation=conversation)
+    await cache_agent_state(user_id, state)
+    return state
+
+
+async def cache_agent_state(user_id: int, state: AgentState):
+    await cache.aset(_agent_state_key(user_id), {
+        'id': state.id,
+        'conversation_id': state.conversation_id,
+        'current_intent': state.current_intent,
+        'collected_data': state.collected_data,
+    }, AGENT_STATE_TTL)
+
+
+class AgentService:
+    """
+    Handles one user's message, fully async: LLM calls, database access and
+    tools all await, so a worker serves many conversations while they wait
+    on Gemini instead of pinning a thread each.
+
+    Cheap to create: the LLM, prompt, chains and tools come from the
+    per-process AgentComponents, and the user's state is a cache read.
+    """
+
+    def __init__(self, user_id: int, agent_state: AgentState):
+        self.user_id = user_id
+        components = get_agent_components()
+        self.agent = components.llm
+        self.prompt = components.prompt
+        self.conversation_chain = components.chain
+        self.summary_chain = components.summary_chain
+        self.tools = components.tools
+        self.agent_state = agent_state
+
+    @classmethod
+    async def create(cls, user_id: int) -> 'AgentService':
+        return cls(user_id, await load_agent_state(user_id))
+
+    async def process_message(self, message: str) -> str:
+        response = await self._local_reply(message)
+        if response is None:
+            response = await self._handle_general_conversation(message)
+        await self._record_turn(message, response)
+        return response
+
+    async def stream_message(self, message: str):
+        """
+        Yield the reply in chunks: LLM tokens as they arrive, or a local reply
+        (structured intents, listings) whole and at once. The turn is persisted
+        when the stream ends, including a partial reply if the client went away.
+        An LLM failure before the first token yields the fallback reply; after it
+        the exception propagates so the reply is not mistaken for a complete one.
+        """
+        response = await self._local_reply(message)
+        if response is not None:
+            yield response
+            await self._record_turn(message, response)
+            return
+
+        chunks = []
+        try:
+            history = await self._build_history()
+            async for chunk in self.conversation_chain.astream({"history": history, "input": message}):
+                chunks.append(chunk)
+                yield chunk
+            suggestions = self._suggestions("".join(chunks))
+            if suggestions:
+                chunks.append(suggestions)
+                yield suggestions
+        except Exception:
+            if chunks:
+                raise  # the client already has part of the reply; let the view send an error event
+            chunks.append(GENERAL_FALLBACK)
+            yield GENERAL_FALLBACK
+        finally:
+            if chunks:
+                await self._record_turn(message, "".join(chunks))
+
+    async def _local_reply(self, message: str):
+        """The reply when it needs no LLM call, else None."""
         try:
             current_intent = self.agent_state.current_intent
             collected_data = self.agent_state.collected_data.copy()
 
             if current_intent:
-                return self._handle_current_intent(message, current_intent, collected_data)
-            return self._handle_new_intent(message)
+                return await self._handle_current_intent(message, current_intent, collected_data)
+            return await self._handle_new_intent(message)
         except Exception as e:
-            self._reset_agent_state()
+            await self._reset_agent_state()
             return f"Oops! Something went wrong. Let's start over. Error: {str(e)}"
 
-    def _handle_current_intent(self, message: str, intent: str, collected_data: Dict) -> str:
+    async def _load_memory(self):
+        """
+        (summary, every message newer than it) for the LLM. Messages wait past
+        MEMORY_WINDOW until a fold takes SUMMARY_BATCH of them, so the window
+        is not cut at MEMORY_WINDOW; MEMORY_MAX only caps a backlog of failed folds.
+        """
+        summary, summarized_up_to = await Conversation.objects.filter(
+            pk=self.agent_state.conversation_id
+        ).values_list('summary', 'summarized_up_to').afirst() or ('', 0)
+        window = [message async for message in Message.objects.filter(
+            conversation_id=self.agent_state.conversation_id, id__gt=summarized_up_to
+        ).order_by('-id')[:MEMORY_MAX]]
+        return summary, list(reversed(window))
+
+    async def _build_history(self) -> str:
+        summary, window = await self._load_memory()
+        history = format_messages(window)
+        if summary:
+            history = f"Summary of the earlier conversation: {summary}\n{history}"
+        return history
+
+    async def _record_turn(self, message: str, response: str):
+        """Persist the exchange, then schedule folding messages that left the window into the summary."""
+        await Message.objects.abulk_create([
+            Message(conversation_id=self.agent_state.conversation_id, content=message, is_user=True),
+            Message(conversation_id=self.agent_state.conversation_id, content=response, is_user=False),
+        ])
+        self._schedule_summary()
+
+    def _schedule_summary(self):
+        """
+        Run the summary fold (a second LLM call) in the background so the reply
+        does not wait on it. At most one fold runs per conversation; a turn that
+        finds one running leaves its messages to the next fold.
+        """
+        conversation_id = self.agent_state.conversation_id
+        if conversation_id in _summary_tasks:
+            return
+        task = asyncio.ensure_future(self._refresh_summary_safely())
+        _summary_tasks[conversation_id] = task  # also keeps the task referenced until it finishes
+        task.add_done_callback(lambda _: _summary_tasks.pop(conversation_id, None))
+
+    async def _refresh_summary_safely(self):
+        try:
+            await self._refresh_summary()
+        except Exception as e:
+            # The summary catches up on a later turn; nothing is lost
+            print("Error refreshing conversation summary:", str(e))
+
+    async def _refresh_summary(self):
+        conversation_id = self.agent_state.conversation_id
+        summary, summarized_up_to = await Conversation.objects.filter(
+            pk=conversation_id
+        ).values_list('summary', 'summarized_up_to').aget()
+        window_start = await Message.objects.filter(
+            conversation_id=conversation_id
+        ).order_by('-id').values_list('id', flat=True)[MEMORY_WINDOW - 1:MEMORY_WINDOW].afirst()
+        if window_start is None:
+            return
+
+        # Oldest first, so the summary grows in order even when several batches are behind
+        overflow = [message async for message in Message.objects.filter(
+            conversation_id=conversation_id, id__gt=summarized_up_to, id__lt=window_start
+        ).order_by('id')[:SUMMARY_MAX_FOLD]]
+        if len(overflow) < SUMMARY_BATCH:
+            return
+
+        new_summary = (await self.summary_chain.ainvoke({
+            "summary": summary or "(none)",
+            "new_lines": format_messages(overflow),
+        })).strip()[:SUMMARY_MAX_CHARS]
+        # Guarded on the old cursor so concurrent requests cannot fold the same messages twice
+        await Conversation.objects.filter(pk=conversation_id, summarized_up_to=summarized_up_to).aupdate(
+            summary=new_summary, summarized_up_to=overflow[-1].id
+        )
+
+    async def _handle_current_intent(self, message: str, intent: str, collected_data: Dict) -> str:
         required_fields = self._get_required_fields(intent, collected_data)
         missing_fields = [f for f in required_fields if f not in collected_data]
 
         if not missing_fields:
-            return self._finalize_creation(intent, collected_data)
+            return await self._finalize_creation(intent, collected_data)
 
         field = missing_fields[0]
         parsed_value = self._parse_field(field, message)
@@ -110,49 +320,54 @@ class AgentService:
             return self._get_invalid_prompt(field)
         
         collected_data[field] = parsed_value
-        self._update_agent_state(collected_data)
+        await self._update_agent_state(collected_data)
 
         next_missing = [f for f in required_fields if f not in collected_data]
-        return self._get_next_prompt(next_missing, intent) if next_missing else self._finalize_creation(intent, collected_data)
-
-    def _handle_new_intent(self, message: str) -> str:
-        if self._is_task_creation_request(message):
-            self._initialize_agent_state('create_task')
-            return "Let's create a new task! What's the name of the task?"
-        if self._is_hobby_creation_request(message):
-            self._initialize_agent_state('create_hobby')
-            return "Let's add a new hobby! What's the name of the hobby?"
-        return self._handle_general_conversation(message)
-
-    def _handle_general_conversation(self, message: str) -> str:
-        try:
-            # Check for task/hobby list requests
-            if any(keyword in message.lower() for keyword in ['show tasks', 'list tasks', 'my tasks']):
-                return self.tools[2]._run(self.user_id)  # GetUserTasksTool
-            
-            if any(keyword in message.lower() for keyword in ['show hobbies', 'list hobbies', 'my hobbies']):
-                return self.tools[3]._run(self.user_id)  # GetUserHobbiesTool
+        return self._get_next_prompt(next_missing, intent) if next_missing else await self._finalize_creation(intent, collected_data)
 
+    async def _handle_new_intent(self, message: str) -> str:
+        # Structured commands are answered locally; only open conversation reaches the LLM
+        route = route_message(message)
+        await record_route(route)
+        if route.intent in ('create_task', 'create_hobby'):
+            return await self._start_creation(route.intent, route.slots)
+        if route.intent == 'list_tasks':
+            return await self.tools[2]._arun(self.user_id)  # GetUserTasksTool
+        if route.intent == 'list_hobbies':
+            return await self.tools[3]._arun(self.user_id)  # GetUserHobbiesTool
+        return None
+
+    async def _start_creation(self, intent: str, slots: Dict) -> str:
+        """Begin a create intent with whatever fields the opening message already gave."""
+        missing_fields = [f for f in self._get_required_fields(intent, slots) if f not in slots]
+        if not missing_fields:
+            return await self._finalize_creation(intent, slots)
+
+        await self._initialize_agent_state(intent, slots)
+        if intent == 'create_task':
+            opening = "Let's create a new task!" if 'task_name' not in slots else f"Let's create '{slots['task_name']}'!"
+        else:
+            opening = "Let's add a new hobby!" if 'name' not in slots else f"Let's add '{slots['name']}'!"
+        return f"{opening} {self._get_next_prompt(missing_fields, intent)}"
+
+    async def _handle_general_conversation(self, message: str) -> str:
+        try:
             # Use conversation chain for general chat
-            response = self.conversation_chain.predict(input=message)
-            
-            # Add default suggestions if the conversation is not productive
-            if not any(keyword in response.lower() for keyword in ['task', 'hobby', 'schedule']):
-                response += "\n\nI can help you with:\n" + \
-                        "- Creating new tasks ('add task')\n" + \
-                        "- Adding hobbies ('add hobby')\n" + \
-                        "- Viewing your tasks ('show tasks')\n" + \
-                        "- Viewing your hobbies ('show hobbies')"
-            
-            return response
+            response = await self.conversation_chain.ainvoke({"history": await self._build_history(), "input": message})
+            return response + self._suggestions(response)
 
         except Exception as e:
-            return "I'm here to help with managing your tasks and hobbies. " + \
-                "You can ask me to:\n" + \
-                "- Create a new task\n" + \
-                "- Add a hobby\n" + \
-                "- Show your tasks\n" + \
-                "- Show your hobbies"
+            return GENERAL_FALLBACK
+
+    def _suggestions(self, response: str) -> str:
+        # Add default suggestions if the conversation is not productive
+        if not any(keyword in response.lower() for keyword in ['task', 'hobby', 'schedule']):
+            return "\n\nI can help you with:\n" + \
+                    "- Creating new tasks ('add task')\n" + \
+                    "- Adding hobbies ('add hobby')\n" + \
+                    "- Viewing your tasks ('show tasks')\n" + \
+                    "- Viewing your hobbies ('show hobbies')"
+        return ""
 
     def _get_required_fields(self, intent: str, data: Dict) -> list:
         fields = {
@@ -227,6 +442,7 @@ class AgentService:
     def _get_next_prompt(self, missing_fields: list, intent: str) -> str:
         prompts = {
             'create_task': {
+                'task_name': "What's the name of the task?",
                 'time_required': "How much time is needed (HH:MM:SS)?",
                 'days_associated': "Which days (comma-separated)?",
                 'priority': "What priority (High/Medium/Low)?",
@@ -234,61 +450,55 @@ class AgentService:
                 'fixed_time_slot': "What time should this be scheduled (HH:MM:SS)?"
             },
             'create_hobby': {
+                'name': "What's the name of the hobby?",
                 'category': "What category does this hobby belong to?"
             }
         }
         next_field = missing_fields[0]
         return prompts[intent].get(next_field, "Please provide the required information.")
 
-    def _finalize_creation(self, intent: str, data: Dict) -> str:
+    async def _finalize_creation(self, intent: str, data: Dict) -> str:
         try:
             # Remove the temporal type conversions here
             if intent == 'create_task':
-                result = self.tools[0]._run(self.user_id, data)
+                result = await self.tools[0]._arun(self.user_id, data)
             elif intent == 'create_hobby':
-                result = self.tools[1]._run(self.user_id, data)
+                result = await self.tools[1]._arun(self.user_id, data)
             else:
                 return "Invalid request."
                 
-            self._reset_agent_state()
+            await self._reset_agent_state()
             return result
         except (IntegrityError, ValidationError) as e:
-            self._reset_agent_state()
+            await self._reset_agent_state()
             return f"Error saving to database: {str(e)}"
         except Exception as e:
-            self._reset_agent_state()
+            await self._reset_agent_state()
             return f"Unexpected error: {str(e)}"
 
-    def _initialize_agent_state(self, intent: str):
+    async def _initialize_agent_state(self, intent: str, data: Dict = None):
         self.agent_state.current_intent = intent
-        self.agent_state.collected_data = {}
-        self.agent_state.save()
+        self.agent_state.collected_data = data or {}
+        await self._save_agent_state()
 
-    def _update_agent_state(self, data: Dict):
+    async def _update_agent_state(self, data: Dict):
         self.agent_state.collected_data = data
-        self.agent_state.save()
+        await self._save_agent_state()
 
-    def _reset_agent_state(self):
+    async def _reset_agent_state(self):
         self.agent_state.current_intent = None
         self.agent_state.collected_data = {}
-        self.agent_state.save()
-
-    def _is_task_creation_request(self, message: str) -> bool:
-    # ...existing code...
-        creation_phrases = [
-            'create task',
-            'add task', 
-            'new task',
-            'make task'
-        ]
-        return any(phrase in message.lower() for phrase in creation_phrases)
-
-    def _is_hobby_creation_request(self, message: str) -> bool:
-        # ...existing code...
-        creation_phrases = [
-            'create hobby',
-            'add hobby',
-            'new hobby',
-            'make hobby'
-        ]
-        return any(phrase in message.lower() for phrase in creation_phrases)
\ No newline at end of file
+        await self._save_agent_state()
+
+    async def _save_agent_state(self):
+        # Write-through: the database stays the source of truth, the cache serves the next message
+        updated = await AgentState.objects.filter(pk=self.agent_state.pk).aupdate(
+            current_intent=self.agent_state.current_intent,
+            collected_data=self.agent_state.collected_data,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            await cache_agent_state(self.user_id, self.agent_state)
+        else:
+            # The conversation was deleted under us; the next message starts a new one
+            await cache.adelete(_agent_state_key(self.user_id))
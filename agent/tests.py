@@ -1,3 +1,311 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Task, User, UserHobby
+
+from . import services
+from .models import Conversation, Message
+from .router import LLM_INTENT, extract_hobby_slots, extract_task_slots, route_message
+from .services import GENERAL_FALLBACK, MEMORY_WINDOW, SUMMARY_BATCH, AgentService
+from .tools import CreateHobbyTool, CreateTaskTool, GetUserHobbiesTool, GetUserTasksTool
+
+
+class RouteMessageTests(SimpleTestCase):
+    ROUTES = [
+        # Create commands win over list patterns that appear later in the sentence
+        ("can you add swimming to my hobbies", 'create_hobby'),
+        ("add cooking to my hobbies", 'create_hobby'),
+        ("add hobby painting", 'create_hobby'),
+        ("new hobby chess in games", 'create_hobby'),
+        ("add gym monday 1h high", 'create_task'),
+        ("new task call mom", 'create_task'),
+        ("please add a task to study for 2 hours", 'create_task'),
+        ("schedule a meeting on friday at 3pm", 'create_task'),
+        # Lists only in imperative or possessive form
+        ("show my tasks", 'list_tasks'),
+        ("can you show me my tasks?", 'list_tasks'),
+        ("what are my tasks today", 'list_tasks'),
+        ("show my new tasks", 'list_tasks'),
+        ("list hobbies", 'list_hobbies'),
+        ("what are my hobbies", 'list_hobbies'),
+        ("my hobbies", 'list_hobbies'),
+        ("my current tasks?", 'list_tasks'),
+        # Questions and conversation go to the LLM
+        ("how do I create a new task?", LLM_INTENT),
+        ("what's the point of hobbies?", LLM_INTENT),
+        ("show me how to plan tasks better", LLM_INTENT),
+        ("how should i balance work and hobbies", LLM_INTENT),
+        ("hello", LLM_INTENT),
+        # A bare "my tasks" is a list only when it is the whole message
+        ("my tasks are too many, help me prioritize", LLM_INTENT),
+        ("my tasks keep slipping, any advice?", LLM_INTENT),
+        ("my hobbies feel like chores lately", LLM_INTENT),
+        # A create verb with details but nothing to call the task is not a create
+        ("add 5 minutes", LLM_INTENT),
+    ]
+
+    def test_routes(self):
+        for message, intent in self.ROUTES:
+            with self.subTest(message=message):
+                self.assertEqual(route_message(message).intent, intent)
+
+    def test_rules_answer_without_llm(self):
+        self.assertEqual(route_message("add gym monday 1h high").source, 'rule')
+        self.assertEqual(route_message("hello").source, 'llm')
+
+
+class SlotExtractionTests(SimpleTestCase):
+    TASK_SLOTS = [
+        ("add gym monday 1h high", {
+            'task_name': 'gym', 'days_associated': ['Monday'], 'time_required': '01:00:00', 'priority': 'High',
+        }),
+        ("schedule a meeting on friday at 3pm", {
+            'task_name': 'meeting', 'days_associated': ['Friday'], 'is_fixed_time': True, 'fixed_time_slot': '15:00:00',
+        }),
+        ("add task read book 30 min low priority", {
+            'task_name': 'read book', 'time_required': '00:30:00', 'priority': 'Low',
+        }),
+        ("add run weekends for 1:30", {
+            'task_name': 'run', 'days_associated': ['Saturday', 'Sunday'], 'time_required': '01:30:00',
+        }),
+        # Interrogatives never supply a name
+        ("how do I create a new task?", {}),
+        ("how do I add a task on monday?", {'days_associated': ['Monday']}),
+    ]
+    HOBBY_SLOTS = [
+        ("add hobby painting", {'name': 'Painting'}),
+        ("new hobby chess in games", {'name': 'Chess', 'category': 'Games'}),
+        ("can you add swimming to my hobbies", {'name': 'Swimming'}),
+        ("how do I add a hobby?", {}),
+    ]
+
+    def test_task_slots(self):
+        for message, slots in self.TASK_SLOTS:
+            with self.subTest(message=message):
+                self.assertEqual(extract_task_slots(message), slots)
+
+    def test_hobby_slots(self):
+        for message, slots in self.HOBBY_SLOTS:
+            with self.subTest(message=message):
+                self.assertEqual(extract_hobby_slots(message), slots)
+
+
+class FakeChain:
+    """Stands in for a prompt | llm | parser chain: canned chunks, then optionally an error."""
+
+    def __init__(self, chunks=(), error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.calls = []
+
+    async def astream(self, inputs):
+        self.calls.append(inputs)
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs)
+        if self.error:
+            raise self.error
+        return "".join(self.chunks)
+
+
+class FakeComponents:
+    def __init__(self, chain, summary_chain=None):
+        self.llm = None
+        self.prompt = None
+        self.chain = chain
+        self.summary_chain = summary_chain or FakeChain(["summary"])
+        self.tools = []
+
+
+class AgentTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="alice", email="alice@example.com")
+
+    def components(self, chain, summary_chain=None):
+        return mock.patch('agent.services._components', FakeComponents(chain, summary_chain))
+
+    async def stream(self, service, message):
+        return [chunk async for chunk in service.stream_message(message)]
+
+
+class AgentPoolingTests(AgentTestCase):
+    @mock.patch('agent.services._components', None)
+    @mock.patch('agent.services.ChatGoogleGenerativeAI')
+    def test_components_are_built_once_per_process(self, llm):
+        with self.settings(GEMINI_API_KEY="key"):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                built = list(pool.map(lambda _: services.get_agent_components(), range(8)))
+        self.assertEqual(llm.call_count, 1)
+        self.assertTrue(all(components is built[0] for components in built))
+
+    def test_state_is_served_from_the_cache(self):
+        with self.components(FakeChain()):
+            first = async_to_sync(AgentService.create)(self.user.id)
+            with self.assertNumQueries(0):
+                second = async_to_sync(AgentService.create)(self.user.id)
+        self.assertEqual(second.agent_state.id, first.agent_state.id)
+
+    async def test_intent_carries_over_to_the_next_request(self):
+        components = FakeComponents(FakeChain())
+        components.tools = [CreateTaskTool(), CreateHobbyTool(), GetUserTasksTool(), GetUserHobbiesTool()]
+        with mock.patch('agent.services._components', components):
+            await (await AgentService.create(self.user.id)).process_message("add a hobby")
+            await (await AgentService.create(self.user.id)).process_message("Chess")
+            reply = await (await AgentService.create(self.user.id)).process_message("Games")
+        self.assertEqual(reply, "Hobby 'Chess' added to your profile!")
+        self.assertEqual(await UserHobby.objects.filter(user=self.user).acount(), 1)
+        # Written through to the database, not only the cache
+        await cache.aclear()
+        self.assertIsNone((await AgentService.create(self.user.id)).agent_state.current_intent)
+
+
+class StreamMessageTests(AgentTestCase):
+    async def test_streams_llm_chunks(self):
+        with self.components(FakeChain(["Hello", " there"])):
+            service = await AgentService.create(self.user.id)
+            chunks = await self.stream(service, "tell me a joke")
+        self.assertEqual(chunks[:2], ["Hello", " there"])
+        self.assertEqual(await Message.objects.filter(is_user=False).values_list('content', flat=True).aget(),
+                         "".join(chunks))
+
+    async def test_failure_before_first_token_falls_back(self):
+        with self.components(FakeChain(error=RuntimeError("quota"))):
+            service = await AgentService.create(self.user.id)
+            chunks = await self.stream(service, "tell me a joke")
+        self.assertEqual(chunks, [GENERAL_FALLBACK])
+
+    async def test_failure_mid_stream_propagates(self):
+        with self.components(FakeChain(["Why did"], error=RuntimeError("connection reset"))):
+            service = await AgentService.create(self.user.id)
+            chunks = []
+            with self.assertRaises(RuntimeError):
+                async for chunk in service.stream_message("tell me a joke"):
+                    chunks.append(chunk)
+        self.assertEqual(chunks, ["Why did"])
+        # The partial reply is still kept in the conversation
+        self.assertEqual(await Message.objects.filter(is_user=False).values_list('content', flat=True).aget(),
+                         "Why did")
+
+
+class ToolTests(AgentTestCase):
+    TASK = {
+        'task_name': 'Gym', 'time_required': '01:00:00', 'days_associated': ['Monday'],
+        'priority': 'High', 'is_fixed_time': False,
+    }
+
+    def test_sync_run_shares_the_async_implementation(self):
+        self.assertEqual(GetUserTasksTool()._run(self.user.id), "You don't have any tasks yet.")
+        self.assertEqual(CreateTaskTool()._run(self.user.id, self.TASK), "Task 'Gym' created successfully!")
+        self.assertEqual(GetUserTasksTool()._run(self.user.id), "- Gym (Priority: High)")
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+
+    async def test_hobby_tools(self):
+        hobby = {'name': 'Chess', 'category': 'Games'}
+        self.assertEqual(await CreateHobbyTool()._arun(self.user.id, hobby), "Hobby 'Chess' added to your profile!")
+        self.assertEqual(await CreateHobbyTool()._arun(self.user.id, hobby), "You already have 'Chess' in your hobbies!")
+        self.assertEqual(await GetUserHobbiesTool()._arun(self.user.id), "- Chess (Games)")
+        self.assertEqual(await UserHobby.objects.filter(user=self.user).acount(), 1)
+
+    def test_invalid_task_reports_an_error(self):
+        result = CreateTaskTool()._run(self.user.id, {**self.TASK, 'time_required': 'soon'})
+        self.assertTrue(result.startswith("Error creating task"))
+
+
+class BlockingChain(FakeChain):
+    """A summary chain that answers only once released."""
+
+    def __init__(self, reply):
+        super().__init__([reply])
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, inputs):
+        await self.release.wait()
+        return await super().ainvoke(inputs)
+
+
+class SummaryTests(AgentTestCase):
+    async def fill_history(self, service, count):
+        await Message.objects.abulk_create([
+            Message(conversation_id=service.agent_state.conversation_id, content=f"line {i}", is_user=i % 2 == 0)
+            for i in range(count)
+        ])
+
+    async def test_reply_does_not_wait_for_the_summary(self):
+        summary_chain = BlockingChain("They like running.")
+        with self.components(FakeChain(["Reply"]), summary_chain):
+            service = await AgentService.create(self.user.id)
+            await self.fill_history(service, MEMORY_WINDOW + SUMMARY_BATCH)
+
+            reply = await asyncio.wait_for(service.process_message("tell me a joke"), timeout=5)
+            self.assertTrue(reply.startswith("Reply"))
+            self.assertEqual(summary_chain.calls, [])  # still waiting in the background
+
+            summary_chain.release.set()
+            await asyncio.gather(*services._summary_tasks.values())
+
+        conversation = await Conversation.objects.aget(pk=service.agent_state.conversation_id)
+        self.assertEqual(conversation.summary, "They like running.")
+        self.assertEqual(services._summary_tasks, {})
+
+    async def test_history_keeps_messages_waiting_to_be_folded(self):
+        with self.components(FakeChain(["Reply"])):
+            service = await AgentService.create(self.user.id)
+            await self.fill_history(service, MEMORY_WINDOW + SUMMARY_BATCH - 1)  # one short of a fold
+            history = await service._build_history()
+        self.assertEqual([line.split(": ")[1] for line in history.split("\n")],
+                         [f"line {i}" for i in range(MEMORY_WINDOW + SUMMARY_BATCH - 1)])
+
+    async def test_history_is_summary_plus_unfolded_messages(self):
+        with self.components(FakeChain(["Reply"]), FakeChain(["They like running."])):
+            service = await AgentService.create(self.user.id)
+            await self.fill_history(service, MEMORY_WINDOW + SUMMARY_BATCH)
+            await service._refresh_summary()
+            history = await service._build_history()
+
+        self.assertTrue(history.startswith("Summary of the earlier conversation: They like running."))
+        self.assertNotIn("line 0\n", history)
+        self.assertEqual(history.count("\n"), MEMORY_WINDOW)  # summary line + the window
+
+    async def test_one_fold_per_conversation_at_a_time(self):
+        summary_chain = BlockingChain("Summary.")
+        with self.components(FakeChain(["Reply"]), summary_chain):
+            service = await AgentService.create(self.user.id)
+            await self.fill_history(service, MEMORY_WINDOW + SUMMARY_BATCH)
+            await service.process_message("tell me a joke")
+            await service.process_message("another one")
+            self.assertEqual(len(services._summary_tasks), 1)
+
+            summary_chain.release.set()
+            await asyncio.gather(*services._summary_tasks.values())
+        self.assertEqual(len(summary_chain.calls), 1)
+
+
+class ChatStreamViewTests(AgentTestCase):
+    async def read_events(self, chain):
+        with self.components(chain):
+            response = await AsyncClient().post(
+                '/api/agent/chat/stream/', {'message': "tell me a joke"}, content_type='application/json',
+                headers={'Authorization': f"Bearer {AccessToken.for_user(self.user)}"},
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        return [block.split("\n")[0] for block in body.strip().split("\n\n")]
+
+    async def test_complete_reply_ends_with_done(self):
+        events = await self.read_events(FakeChain(["Hi", "!"]))
+        self.assertEqual(events[0], "event: token")
+        self.assertEqual(events[-1], "event: done")
+
+    async def test_mid_stream_failure_ends_with_error(self):
+        events = await self.read_events(FakeChain(["Why did"], error=RuntimeError("connection reset")))
+        self.assertEqual(events, ["event: token", "event: error"])
@@ -1,4 +1,5 @@
 from typing import Optional, Dict, Any, Type
+from asgiref.sync import async_to_sync
 from langchain.tools import BaseTool
 from core.models import Task, Hobby, UserHobby
 from django.contrib.auth import get_user_model
@@ -17,28 +18,20 @@ class HobbyInput(BaseModel):
 class UserIdInput(BaseModel):
     user_id: int = Field(description="The ID of the user")
 
+# Each tool is implemented once, async; _run serves synchronous callers from the same code
 class CreateTaskTool(BaseTool):
     name: str = "create_task"
     description: str = "Create a new task for the user"
     args_schema: Type[BaseModel] = TaskInput
     
     def _run(self, user_id: int, task_data: Dict[str, Any]) -> str:
-        try:
-            user = User.objects.get(pk=user_id)
-            
-            # Convert duration string to timedelta
-            time_required = parse_duration(task_data['time_required'])
-            if not time_required:
-                raise ValueError("Invalid time_required format. Use HH:MM:SS")
-                
-            # Handle optional fixed_time_slot
-            fixed_time_slot = None
-            if task_data.get('fixed_time_slot'):
-                fixed_time_slot = parse_time(task_data['fixed_time_slot'])
-                if not fixed_time_slot:
-                    raise ValueError("Invalid fixed_time_slot format. Use HH:MM:SS")
+        return async_to_sync(self._arun)(user_id, task_data)
 
-            Task.objects.create(
+    async def _arun(self, user_id: int, task_data: Dict[str, Any]) -> str:
+        try:
+            user = await User.objects.aget(pk=user_id)
+            time_required, fixed_time_slot = self._parse_times(task_data)
+            await Task.objects.acreate(
                 user=user,
                 task_name=task_data['task_name'],
                 time_required=time_required,
@@ -51,21 +44,39 @@ class CreateTaskTool(BaseTool):
         except Exception as e:
             return f"Error creating task: {str(e)}"
 
+    @staticmethod
+    def _parse_times(task_data: Dict[str, Any]):
+        # Convert duration string to timedelta
+        time_required = parse_duration(task_data['time_required'])
+        if not time_required:
+            raise ValueError("Invalid time_required format. Use HH:MM:SS")
+
+        # Handle optional fixed_time_slot
+        fixed_time_slot = None
+        if task_data.get('fixed_time_slot'):
+            fixed_time_slot = parse_time(task_data['fixed_time_slot'])
+            if not fixed_time_slot:
+                raise ValueError("Invalid fixed_time_slot format. Use HH:MM:SS")
+        return time_required, fixed_time_slot
+
 class CreateHobbyTool(BaseTool):
     name: str = "create_hobby"
     description: str = "Create a new hobby and add it to the user's profile"
     args_schema: Type[BaseModel] = HobbyInput
     
     def _run(self, user_id: int, hobby_data: Dict[str, str]) -> str:
+        return async_to_sync(self._arun)(user_id, hobby_data)
+
+    async def _arun(self, user_id: int, hobby_data: Dict[str, str]) -> str:
         try:
-            user = User.objects.get(pk=user_id)
-            hobby, created = Hobby.objects.get_or_create(
+            user = await User.objects.aget(pk=user_id)
+            hobby, created = await Hobby.objects.aget_or_create(
                 name=hobby_data['name'],
                 category=hobby_data['category']
             )
-            
-            if not UserHobby.objects.filter(user=user, hobby=hobby).exists():
-                UserHobby.objects.create(user=user, hobby=hobby)
+
+            if not await UserHobby.objects.filter(user=user, hobby=hobby).aexists():
+                await UserHobby.objects.acreate(user=user, hobby=hobby)
                 return f"Hobby '{hobby.name}' added to your profile!"
             else:
                 return f"You already have '{hobby.name}' in your hobbies!"
@@ -78,9 +89,12 @@ class GetUserTasksTool(BaseTool):
     args_schema: Type[BaseModel] = UserIdInput
     
     def _run(self, user_id: int) -> str:
+        return async_to_sync(self._arun)(user_id)
+
+    async def _arun(self, user_id: int) -> str:
         try:
-            tasks = Task.objects.filter(user_id=user_id)
-            if not tasks.exists():
+            tasks = [task async for task in Task.objects.filter(user_id=user_id).only('task_name', 'priority')]
+            if not tasks:
                 return "You don't have any tasks yet."
             return "\n".join([f"- {task.task_name} (Priority: {task.priority})" for task in tasks])
         except Exception as e:
@@ -92,9 +106,14 @@ class GetUserHobbiesTool(BaseTool):
     args_schema: Type[BaseModel] = UserIdInput
     
     def _run(self, user_id: int) -> str:
+        return async_to_sync(self._arun)(user_id)
+
+    async def _arun(self, user_id: int) -> str:
         try:
-            user_hobbies = UserHobby.objects.filter(user_id=user_id).select_related('hobby')
-            if not user_hobbies.exists():
+            user_hobbies = [
+                user_hobby async for user_hobby in UserHobby.objects.filter(user_id=user_id).select_related('hobby')
+            ]
+            if not user_hobbies:
                 return "You don't have any hobbies yet."
             return "\n".join([f"- {user_hobby.hobby.name} ({user_hobby.hobby.category})" for user_hobby in user_hobbies])
         except Exception as e:
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ChatView
+from .views import ChatView, ChatStreamView
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
-] 
\ No newline at end of file
+    path('chat/stream/', ChatStreamView.as_view(), name='chat-stream'),
+]
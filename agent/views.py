@@ -1,9 +1,8 @@
+import json
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework.views import APIView
-from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.async_views import AsyncAPIView
 from .services import AgentService
 from .models import Conversation, Message
 from rest_framework import serializers
@@ -15,66 +14,109 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['content', 'is_user', 'created_at']
 
-class ChatView(APIView):
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    
-    def post(self, request):
+class ChatView(AsyncAPIView):
+    async def post(self, request):
         print("=== ChatView POST Request ===")
         print("Request headers:", request.headers)
         print("Request data:", request.data)
-        print("User:", request.user)
+        print("User:", request.user.id)
         
         user_message = request.data.get('message')
         if not user_message:
             print("Error: No message provided")
-            return Response(
+            return JsonResponse(
                 {"error": "Message is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
         try:
             print("Creating AgentService for user:", request.user.id)
-            agent_service = AgentService(request.user.id)
+            agent_service = await AgentService.create(request.user.id)
             print("Processing message with agent service")
-            response = agent_service.process_message(user_message)
+            response = await agent_service.process_message(user_message)
             print("Agent response:", response)
-            return Response({"response": response})
+            return JsonResponse({"response": response})
         except Exception as e:
             print("Error in ChatView:", str(e))
             import traceback
             print("Traceback:", traceback.format_exc())
-            return Response(
+            return JsonResponse(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
             
-    def get(self, request):
+    async def get(self, request):
         print("=== ChatView GET Request ===")
         print("Request headers:", request.headers)
-        print("User:", request.user)
+        print("User:", request.user.id)
         
         try:
-            conversation = Conversation.objects.filter(
+            conversation = await Conversation.objects.filter(
                 user=request.user,
                 is_active=True
-            ).first()
+            ).afirst()
             
             if not conversation:
                 print("No active conversation found for user")
-                return Response({"messages": []})
+                return JsonResponse({"messages": []})
                 
-            messages = Message.objects.filter(
+            messages = [message async for message in Message.objects.filter(
                 conversation=conversation
-            ).order_by('created_at')
+            ).order_by('created_at', 'id')]
             
             serializer = MessageSerializer(messages, many=True)
-            return Response({"messages": serializer.data})
+            return JsonResponse({"messages": serializer.data})
         except Exception as e:
             print("Error in ChatView GET:", str(e))
             import traceback
             print("Traceback:", traceback.format_exc())
-            return Response(
+            return JsonResponse(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChatStreamView(AsyncAPIView):
+    """
+    POST {"message": ...} -> text/event-stream.
+
+    Streams the agent's reply as `token` events ({"text": chunk}) while the
+    LLM produces it, then one `done` event ({"response": full reply}).
+    Structured intents are answered locally in a single token event. If the
+    LLM fails mid-reply an `error` event ends the stream instead of `done`.
+    Served by an ASGI server (see README) the first token reaches the client
+    as soon as the LLM emits it; WSGI buffers the whole response.
+    """
+
+    async def post(self, request):
+        user_message = request.data.get('message')
+        if not user_message:
+            return JsonResponse({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            agent_service = await AgentService.create(request.user.id)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        async def events():
+            stream = agent_service.stream_message(user_message)
+            chunks = []
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield sse("token", {"text": chunk})
+                yield sse("done", {"response": "".join(chunks)})
+            except Exception as e:
+                yield sse("error", {"error": str(e)})
+            finally:
+                # Persists the (partial) reply right away if the client disconnected mid-stream
+                await stream.aclose()
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # let nginx pass tokens through unbuffered
+        return response
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedMessage, ConversationSummary, Message
+
+ARCHIVE_FIELDS = ('id', 'sender_id', 'receiver_id', 'message', 'timestamp')
+
+
+def archive_horizon():
+    """Everything in ArchivedMessage is older than this."""
+    return timezone.now() - timedelta(days=settings.CHAT_HOT_DAYS)
+
+
+def archived_conversation(user_id, friend_id):
+    return ArchivedMessage.objects.filter(
+        Q(sender_id=user_id, receiver_id=friend_id) | Q(sender_id=friend_id, receiver_id=user_id)
+    )
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move up to batch_size messages older than cutoff into ArchivedMessage.
+    A conversation's latest message stays hot, since the inbox points at it.
+    Returns the number of messages moved.
+    """
+    with transaction.atomic():
+        ids = list(
+            Message.objects.filter(timestamp__lt=cutoff)
+            .exclude(id__in=ConversationSummary.objects.filter(last_message__isnull=False).values('last_message_id'))
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        rows = list(Message.objects.filter(id__in=ids).select_for_update().values(*ARCHIVE_FIELDS))
+        ArchivedMessage.objects.bulk_create([ArchivedMessage(**row) for row in rows], ignore_conflicts=True)
+
+        pairs = {(row['sender_id'], row['receiver_id']) for row in rows}
+        sides = Q()
+        for sender_id, receiver_id in pairs:
+            sides |= Q(user_id=sender_id, friend_id=receiver_id) | Q(user_id=receiver_id, friend_id=sender_id)
+        ConversationSummary.objects.filter(sides, has_archive=False).update(has_archive=True)
+
+        Message.objects.filter(id__in=ids).delete()
+    return len(rows)
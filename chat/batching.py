@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+
+from .models import Message
+from .services import persist_messages
+
+BATCH_MAX_SIZE = 200     # flush as soon as this many messages are waiting
+BATCH_MAX_DELAY = 0.02   # seconds a message may wait for others to share its insert
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBatcher:
+    """
+    Collects messages from every consumer on this worker and saves them with a
+    single bulk_create (and one summary upsert) per flush.
+
+    `save` resolves with the saved Message, so callers can acknowledge the
+    sender with the real id once the row is committed.
+    """
+
+    def __init__(self, max_size=BATCH_MAX_SIZE, max_delay=BATCH_MAX_DELAY):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+        self.writes = set()  # strong references, or the loop may collect a write mid-flight
+
+    async def save(self, sender_id, receiver_id, text):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((Message(sender_id=sender_id, receiver_id=receiver_id, message=text), future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self.write(batch))
+            self.writes.add(task)
+            task.add_done_callback(self.write_done)
+
+    def write_done(self, task):
+        self.writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Message batch write failed", exc_info=task.exception())
+
+    async def write(self, batch):
+        try:
+            await database_sync_to_async(self.persist)([message for message, _ in batch])
+        except Exception as e:
+            logger.exception("Failed to save a batch of %d messages", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for message, future in batch:
+            if not future.done():  # the sender may have disconnected meanwhile
+                future.set_result(message)
+
+    @staticmethod
+    def persist(messages):
+        persist_messages(messages)
+
+
+# One batcher per event loop, i.e. per worker process
+_batchers = weakref.WeakKeyDictionary()
+
+
+def get_batcher():
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = MessageBatcher()
+    return batcher
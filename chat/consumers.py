@@ -1,10 +1,15 @@
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+import time
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from core.models import Friendship, Message, User
-import models, datetime
+from social.services import are_friends, get_friend_ids
+from core.counters import get_counters
+from .delivery import adeliver_message, adeliver_read_receipt
+from . import presence
+from .realtime import envelope, push, room_group, user_group
 
+# Legacy: one socket per conversation. New clients should use UserConsumer.
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
@@ -12,15 +17,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.friend_id = self.scope['url_route']['kwargs']['friend_id']
-        
+        # Resolved once per connection; an accepted friendship implies the friend exists
+        self.friend_id = int(self.scope['url_route']['kwargs']['friend_id'])
+
         # Check if users are friends
         if not await self.are_friends(self.user.id, self.friend_id):
             await self.close()
             return
 
-        self.room_name = f"chat_{min(self.user.id, int(self.friend_id))}_{max(self.user.id, int(self.friend_id))}"
-        self.room_group_name = f"chat_{self.room_name}"
+        self.room_group_name = room_group(self.user.id, self.friend_id)
 
         # Join room group
         await self.channel_layer.group_add(
@@ -31,55 +36,168 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Leave room group (connect may have refused before joining)
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
 
     @database_sync_to_async
     def are_friends(self, user1_id, user2_id):
-        return Friendship.objects.filter(
-            (models.Q(user_id=user1_id, friend_id=user2_id) | models.Q(user_id=user2_id, friend_id=user1_id)),
-            status="Accepted"
-        ).exists()
-
-    @database_sync_to_async
-    def create_message(self, sender, receiver, message):
-        return Message.objects.create(
-            sender=sender,
-            receiver=receiver,
-            message=message
-        )
+        return are_friends(user1_id, user2_id)
 
     # Receive message from WebSocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        message = text_data_json['message']
+        message = text_data_json.get('message', '')
+        client_id = text_data_json.get('client_id')
+        if not isinstance(message, str) or not message.strip():
+            await self.send(text_data=json.dumps({'type': 'error', 'client_id': client_id, 'error': 'Message cannot be empty.'}))
+            return
 
-        # Save message to database
-        receiver = await database_sync_to_async(User.objects.get)(id=self.friend_id)
-        await self.create_message(self.user, receiver, message)
+        # Save (batched with other senders on this worker) and send to the room and both users' sockets
+        saved = await adeliver_message(self.user.id, self.friend_id, message)
 
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'sender_id': self.user.id,
-                'timestamp': str(datetime.now())
-            }
-        )
+        # Acknowledge the sender with the stored id
+        await self.send(text_data=json.dumps({
+            'type': 'ack',
+            'client_id': client_id,
+            'id': saved.id,
+            'timestamp': saved.timestamp.isoformat(),
+        }))
 
     # Receive message from room group
     async def chat_message(self, event):
-        message = event['message']
-        sender_id = event['sender_id']
-
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
-            'message': message,
-            'sender_id': sender_id,
+            'type': 'message',
+            'id': event['id'],
+            'message': event['message'],
+            'sender_id': event['sender_id'],
             'timestamp': event['timestamp']
-        }))
\ No newline at end of file
+        }))
+
+
+class UserConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One socket per user carrying every conversation. Frames are
+    {"type": ..., "data": {...}, "ref": optional client correlation id}.
+
+    Client -> server: message.send {to, message}, typing {to, typing}, read {friend_id, up_to}, ping
+    Server -> client: message.new, message.ack, typing, read, counters, presence, pong, error
+    """
+    FRIEND_SET_TTL = 30  # seconds before the connection re-reads the friend list
+    TYPING_THROTTLE = 3  # forward at most one "is typing" per friend this often
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if self.user == AnonymousUser():
+            await self.close()
+            return
+
+        self.group_name = user_group(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.load_friends()
+        await self.send_event('counters', await database_sync_to_async(get_counters)(self.user.id))
+
+        self.typing_sent_at = {}
+        self.heartbeat_at = time.monotonic()
+        self.presence_slot, came_online = await presence.connect(self.user.id, self.channel_name)
+        if came_online:
+            await push(self.friend_ids, 'presence', {'user_id': self.user.id, 'online': True, 'last_seen': None})
+        snapshot = await presence.aget_presence(self.friend_ids)
+        await self.send_event('presence', {'friends': {str(user_id): state for user_id, state in snapshot.items()}})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, 'presence_slot'):
+            last_seen = await presence.disconnect(self.user.id, self.channel_name, self.presence_slot)
+            if last_seen is not None:
+                await push(self.friend_ids, 'presence', {'user_id': self.user.id, 'online': False, 'last_seen': last_seen})
+
+    async def keep_alive(self):
+        """Any frame proves the socket is alive; renew its presence slot at most once per interval."""
+        if time.monotonic() - self.heartbeat_at >= presence.HEARTBEAT_INTERVAL:
+            self.heartbeat_at = time.monotonic()
+            self.presence_slot = await presence.heartbeat(self.user.id, self.channel_name, self.presence_slot)
+
+    async def load_friends(self):
+        self.friend_ids = await database_sync_to_async(get_friend_ids)(self.user.id)
+        self.friends_loaded_at = time.monotonic()
+
+    async def is_friend(self, user_id):
+        """Answered from the connection's friend set; re-read when stale or the id is unknown."""
+        if user_id not in self.friend_ids or time.monotonic() - self.friends_loaded_at > self.FRIEND_SET_TTL:
+            await self.load_friends()
+        return user_id in self.friend_ids
+
+    async def send_event(self, kind, data, ref=None):
+        await self.send_json(envelope(kind, data, ref))
+
+    async def receive_json(self, content):
+        if not isinstance(content, dict):
+            await self.send_event('error', {'error': 'Frames must be JSON objects.'})
+            return
+        ref = content.get('ref')
+        await self.keep_alive()
+        if content.get('type') == 'ping':
+            await self.send_event('pong', {}, ref)
+            return
+        handler = self.handlers.get(content.get('type'))
+        if handler is None:
+            await self.send_event('error', {'error': f"Unknown frame type: {content.get('type')}"}, ref)
+            return
+
+        data = content.get('data') or {}
+        try:
+            target = int(data.get('to', data.get('friend_id')))
+        except (TypeError, ValueError):
+            await self.send_event('error', {'error': 'A friend id is required.'}, ref)
+            return
+        if not await self.is_friend(target):
+            await self.send_event('error', {'error': 'You are not friends with this user.'}, ref)
+            return
+        await getattr(self, handler)(target, data, ref)
+
+    handlers = {
+        'message.send': 'on_message_send',
+        'typing': 'on_typing',
+        'read': 'on_read',
+    }
+
+    async def on_message_send(self, friend_id, data, ref):
+        message = data.get('message')
+        if not isinstance(message, str) or not message.strip():
+            await self.send_event('error', {'error': 'Message cannot be empty.'}, ref)
+            return
+        saved = await adeliver_message(self.user.id, friend_id, message)
+        await self.send_event('message.ack', {'id': saved.id, 'timestamp': saved.timestamp.isoformat()}, ref)
+
+    async def on_typing(self, friend_id, data, ref):
+        typing = bool(data.get('typing', True))
+        now = time.monotonic()
+        if typing:
+            # Keystroke-rate typing frames collapse into one event per throttle window
+            if now - self.typing_sent_at.get(friend_id, 0) < self.TYPING_THROTTLE:
+                return
+            self.typing_sent_at[friend_id] = now
+        else:
+            self.typing_sent_at.pop(friend_id, None)
+        await push([friend_id], 'typing', {'user_id': self.user.id, 'typing': typing})
+
+    async def on_read(self, friend_id, data, ref):
+        up_to = data.get('up_to')
+        if up_to is not None and not isinstance(up_to, int):
+            await self.send_event('error', {'error': 'up_to must be a message id.'}, ref)
+            return
+        if await adeliver_read_receipt(self.user.id, friend_id, up_to) is None:
+            return  # already read that far
+        # Let the user's other devices update their badges
+        await push([self.user.id], 'counters', await database_sync_to_async(get_counters)(self.user.id))
+
+    # Events sent to the user's group
+    async def user_event(self, event):
+        await self.send_json(event['event'])
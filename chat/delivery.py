@@ -0,0 +1,43 @@
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.db import transaction
+
+from .batching import get_batcher
+from .models import Message
+from .realtime import broadcast_message, broadcast_read
+from .services import mark_conversation_read, persist_messages
+
+# Every message, whether sent over REST or a socket, goes through the same two
+# steps: services.persist_messages (row, conversation summary and unread counter
+# in one transaction) and realtime.broadcast_message (both participants' sockets).
+
+
+def deliver_message(sender, receiver, text):
+    """Save and broadcast a message from a synchronous caller (the REST view)."""
+    message = Message(sender=sender, receiver=receiver, message=text)
+    persist_messages([message])
+    # Broadcast only once the row is visible to readers
+    transaction.on_commit(lambda: async_to_sync(broadcast_message)(message))
+    return message
+
+
+async def adeliver_message(sender_id, receiver_id, text):
+    """Save (batched with other senders on this worker) and broadcast a message from a socket."""
+    message = await get_batcher().save(sender_id, receiver_id, text)
+    await broadcast_message(message)
+    return message
+
+
+def deliver_read_receipt(user_id, friend_id, up_to=None):
+    """Advance the user's read cursor and, if it moved, send the receipt. Returns the cursor or None."""
+    last_read_id = mark_conversation_read(user_id, friend_id, up_to)
+    if last_read_id is not None:
+        transaction.on_commit(lambda: async_to_sync(broadcast_read)(user_id, friend_id, last_read_id))
+    return last_read_id
+
+
+async def adeliver_read_receipt(user_id, friend_id, up_to=None):
+    last_read_id = await database_sync_to_async(mark_conversation_read)(user_id, friend_id, up_to)
+    if last_read_id is not None:
+        await broadcast_read(user_id, friend_id, last_read_id)
+    return last_read_id
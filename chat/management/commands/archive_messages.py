@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from chat.archive import archive_batch
+from chat.models import ArchivedMessage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move chat messages older than CHAT_HOT_DAYS from the hot message table into "
+        "the archive table, in batches. Safe to run repeatedly (e.g. nightly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_HOT_DAYS,
+                            help='Archive messages older than this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Messages moved per transaction.')
+        parser.add_argument('--tablespace',
+                            help='Also relocate the archive table and its indexes to this (cheaper) '
+                                 'PostgreSQL tablespace. Rewrites the table under an exclusive lock.')
+
+    def handle(self, *args, **options):
+        if options['days'] < settings.CHAT_HOT_DAYS:
+            # History reads only look in the archive for rows older than CHAT_HOT_DAYS
+            raise CommandError(f"--days must be at least CHAT_HOT_DAYS ({settings.CHAT_HOT_DAYS}).")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        moved = 0
+        while True:
+            batch = archive_batch(cutoff, options['batch_size'])
+            if not batch:
+                break
+            moved += batch
+            self.stdout.write(f"Archived {moved} messages...")
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} messages older than {cutoff:%Y-%m-%d}."))
+
+        if options['tablespace']:
+            self.move_to_tablespace(options['tablespace'])
+
+    def move_to_tablespace(self, tablespace):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Tablespaces are only supported on PostgreSQL.")
+        quote = connection.ops.quote_name
+        table = ArchivedMessage._meta.db_table
+        with connection.cursor() as cursor:
+            indexes = [
+                name for name, info in connection.introspection.get_constraints(cursor, table).items()
+                if info['index'] or info['primary_key']
+            ]
+            cursor.execute(f"ALTER TABLE {quote(table)} SET TABLESPACE {quote(tablespace)}")
+            for name in indexes:
+                cursor.execute(f"ALTER INDEX {quote(name)} SET TABLESPACE {quote(tablespace)}")
+        self.stdout.write(self.style.SUCCESS(f"Moved {table} and {len(indexes)} indexes to tablespace {tablespace}."))
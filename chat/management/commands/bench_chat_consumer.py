@@ -0,0 +1,85 @@
+import asyncio
+import json
+import time
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat.consumers import ChatConsumer
+from chat.management.load import (
+    BenchSocket, add_database_guard, check_database, create_friend_pairs, delete_friend_pairs,
+)
+from chat.models import Message
+from chat.services import record_message
+from core.models import User
+
+
+class PerFrameChatConsumer(ChatConsumer):
+    """The previous receive path: look the friend up and insert one row per frame."""
+
+    @database_sync_to_async
+    def create_message(self, receiver, text):
+        with transaction.atomic():
+            message = Message.objects.create(sender=self.user, receiver=receiver, message=text)
+            record_message(message)
+        return message
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        receiver = await database_sync_to_async(User.objects.get)(id=self.friend_id)
+        saved = await self.create_message(receiver, data['message'])
+        await self.send(text_data=json.dumps({'type': 'ack', 'client_id': data.get('client_id'), 'id': saved.id}))
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'chat_message', 'id': saved.id, 'message': data['message'],
+            'sender_id': self.user.id, 'timestamp': saved.timestamp.isoformat(),
+        })
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure chat WebSocket throughput (messages/second on this worker) for the "
+        "per-frame write path and the batched write path, using the configured database "
+        "and channel layer. Benchmark users are created and deleted by the run, in a test "
+        "database unless --allow-non-test-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=50, help='Concurrent sockets (each a distinct sender).')
+        parser.add_argument('--messages', type=int, default=40, help='Messages sent per socket.')
+        add_database_guard(parser)
+
+    def handle(self, *args, **options):
+        check_database(options, options['connections'] * 2)
+        pairs = create_friend_pairs(options['connections'], 'bench')
+        try:
+            for label, consumer in (("per-frame", PerFrameChatConsumer), ("batched", ChatConsumer)):
+                rate = asyncio.run(self.run(consumer, pairs, options['messages']))
+                self.stdout.write(f"{label:>10}: {rate:,.0f} messages/s")
+        finally:
+            delete_friend_pairs(pairs)
+
+    async def run(self, consumer, pairs, per_socket):
+        sockets = [
+            BenchSocket(consumer.as_asgi(), f"/ws/chat/{receiver.id}/", user=sender,
+                        url_route={'args': (), 'kwargs': {'friend_id': str(receiver.id)}})
+            for sender, receiver in pairs
+        ]
+        for socket in sockets:
+            if not await socket.connect():
+                raise RuntimeError("Benchmark socket was refused")
+
+        async def send_all(socket):
+            for n in range(per_socket):
+                await socket.send_json({'message': f"bench {n}", 'client_id': n})
+                # Wait for our own ack; the room broadcast echoes back as well
+                while (await socket.receive_json()).get('type') != 'ack':
+                    pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send_all(socket) for socket in sockets))
+        elapsed = time.perf_counter() - start
+
+        for socket in sockets:
+            await socket.close()
+        return len(sockets) * per_socket / elapsed
@@ -0,0 +1,189 @@
+import asyncio
+import itertools
+import json
+import statistics
+import time
+import tracemalloc
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.management.load import (
+    BenchSocket, add_database_guard, check_database, create_friend_pairs, delete_friend_pairs,
+)
+
+MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered) * 1000, 2),
+        'p50': at(0.50),
+        'p95': at(0.95),
+        'p99': at(0.99),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+class QueryCounter:
+    """Database execute wrapper counting every query the worker thread runs."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the chat WebSocket stack in-process through backend.asgi.application: open "
+        "authenticated sockets for synthetic friend pairs, send messages at a fixed rate and "
+        "print connect latency, fan-out latency percentiles, database queries per message and "
+        "memory per connection as JSON. Synthetic users are deleted afterwards; they go into a "
+        "test database unless --allow-non-test-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=500, help='Friend pairs; two sockets each.')
+        parser.add_argument('--rate', type=float, default=200, help='Messages per second across all senders.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to send for.')
+        parser.add_argument('--endpoint', choices=['user', 'chat'], default='user',
+                            help="'user' for ws/user/, 'chat' for the legacy ws/chat/<friend_id>/.")
+        parser.add_argument('--layer', choices=['memory', 'configured'], default='memory',
+                            help='In-memory channel layer, or the CHANNEL_LAYERS setting (Redis).')
+        parser.add_argument('--connect-concurrency', type=int, default=100, help='Sockets opened at once.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+        add_database_guard(parser)
+
+    def handle(self, *args, **options):
+        check_database(options, options['pairs'] * 2)
+        layers = MEMORY_LAYER if options['layer'] == 'memory' else settings.CHANNEL_LAYERS
+        users = create_friend_pairs(options['pairs'], 'load')
+        pairs = [(a.id, b.id) for a, b in users]
+        tokens = {user.id: str(AccessToken.for_user(user)) for pair in users for user in pair}
+        try:
+            with override_settings(CHANNEL_LAYERS=layers):
+                report = asyncio.run(self.run(pairs, tokens, options))
+        finally:
+            delete_friend_pairs(users)
+
+        report['config'] = {key: options[key] for key in ('pairs', 'rate', 'duration', 'endpoint', 'layer')}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def auth(self, user_id, tokens):
+        """(headers, query string) that authenticate a socket as the user."""
+        return [(b'host', b'testserver')], f"token={tokens[user_id]}".encode()
+
+    async def run(self, pairs, tokens, options):
+        from backend.asgi import application
+
+        counter = QueryCounter()
+        await database_sync_to_async(lambda: connections['default'].execute_wrappers.append(counter))()
+
+        def socket_for(user_id, friend_id):
+            path = '/ws/user/' if options['endpoint'] == 'user' else f'/ws/chat/{friend_id}/'
+            headers, query_string = self.auth(user_id, tokens)
+            socket = BenchSocket(application, path, headers, query_string)
+            socket.user_id = user_id
+            return socket
+
+        sockets = [socket_for(a, b) for a, b in pairs] + [socket_for(b, a) for a, b in pairs]
+
+        # Connect phase: latency per socket and memory held per open connection
+        connect_latencies, refused = [], 0
+        gate = asyncio.Semaphore(options['connect_concurrency'])
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+        async def connect(socket):
+            nonlocal refused
+            async with gate:
+                start = time.perf_counter()
+                if await socket.connect():
+                    connect_latencies.append(time.perf_counter() - start)
+                else:
+                    refused += 1
+
+        await asyncio.gather(*(connect(socket) for socket in sockets))
+        memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / max(len(sockets), 1)
+        tracemalloc.stop()
+
+        # Send phase: timestamps travel in the message text and are matched on delivery
+        sent_at, fanout, errors = {}, [], []
+
+        async def read(socket):
+            async for frame in socket.frames():
+                if frame.get('type') == 'error':
+                    errors.append(frame)
+                    continue
+                text = frame.get('data', {}).get('message') if options['endpoint'] == 'user' else frame.get('message')
+                sender_id = frame.get('data', {}).get('sender') if options['endpoint'] == 'user' else frame.get('sender_id')
+                if text in sent_at and sender_id != socket.user_id:
+                    fanout.append(time.perf_counter() - sent_at[text])
+
+        readers = [asyncio.ensure_future(read(socket)) for socket in sockets]
+        senders = itertools.cycle(zip(sockets[:len(pairs)], pairs))
+        queries_before = counter.count
+        total = int(options['rate'] * options['duration'])
+        interval = 1 / options['rate']
+        start = time.perf_counter()
+        for n in range(total):
+            # Hold the schedule without drifting
+            delay = start + n * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            socket, (sender_id, receiver_id) = next(senders)
+            text = f"load {n}"
+            sent_at[text] = time.perf_counter()
+            if options['endpoint'] == 'user':
+                await socket.send_json({'type': 'message.send', 'ref': n, 'data': {'to': receiver_id, 'message': text}})
+            else:
+                await socket.send_json({'message': text, 'client_id': n})
+        send_elapsed = time.perf_counter() - start
+
+        # Let in-flight messages land
+        deadline = time.perf_counter() + 10
+        while len(fanout) < total and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        queries = counter.count - queries_before
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*(socket.close() for socket in sockets), return_exceptions=True)
+
+        return {
+            'connections': {
+                'opened': len(connect_latencies),
+                'refused': refused,
+                'connect_ms': percentiles(connect_latencies),
+                'memory_per_connection_kb': round(memory_per_connection / 1024, 2),
+            },
+            'messages': {
+                'sent': total,
+                'delivered': len(fanout),
+                'target_rate': options['rate'],
+                'achieved_send_rate': round(total / send_elapsed, 1) if send_elapsed else None,
+                'fanout_ms': percentiles(fanout),
+                'db_queries_per_message': round(queries / total, 2) if total else None,
+                'errors': len(errors),
+            },
+        }
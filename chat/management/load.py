@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from django.core.management.base import CommandError
+from django.db import connection
+
+from core.management.commands.explain_hot_queries import is_test_database
+from core.models import Friendship, User
+from social.services import invalidate_friends
+
+# Shared by the chat benchmark and load-test commands: in-process sockets and
+# synthetic friend pairs, which only go into a test database unless asked.
+
+
+def add_database_guard(parser):
+    parser.add_argument('--allow-non-test-db', action='store_true',
+                        help='Create (and afterwards delete) the synthetic users in a database that is not a test database.')
+
+
+def check_database(options, users):
+    if not is_test_database(connection.settings_dict) and not options['allow_non_test_db']:
+        raise CommandError(
+            f"Refusing to create {users} synthetic users in '{connection.settings_dict['NAME']}', which is not a "
+            "test database. Point the command at a test database, or pass --allow-non-test-db."
+        )
+
+
+def create_friend_pairs(count, prefix):
+    """`count` pairs of new users, each pair friends with each other."""
+    tag = int(time.time())
+    users = User.objects.bulk_create([
+        User(username=f"{prefix}_{tag}_{i}", email=f"{prefix}_{tag}_{i}@example.com", password="!")
+        for i in range(count * 2)
+    ], batch_size=1000)
+    pairs = list(zip(users[::2], users[1::2]))
+    Friendship.objects.bulk_create([
+        Friendship(user_low_id=min(a.id, b.id), user_high_id=max(a.id, b.id), requester=a, status="Accepted")
+        for a, b in pairs
+    ], batch_size=1000)
+    invalidate_friends(*[user.id for user in users])
+    return pairs
+
+
+def delete_friend_pairs(pairs):
+    User.objects.filter(id__in=[user.id for pair in pairs for user in pair]).delete()
+
+
+class BenchSocket(ApplicationCommunicator):
+    """
+    A client WebSocket driving an ASGI application in-process. Extra scope keys
+    (user, url_route) let it talk to a bare consumer without the auth middleware.
+    """
+
+    def __init__(self, application, path, headers=(), query_string=b'', **scope):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'raw_path': path.encode(),
+            'headers': list(headers),
+            'query_string': query_string,
+            'subprotocols': [],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+            **scope,
+        })
+
+    async def connect(self):
+        await self.send_input({'type': 'websocket.connect'})
+        return (await self.receive_output(timeout=30))['type'] == 'websocket.accept'
+
+    async def send_json(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json(self):
+        return json.loads((await self.receive_output(timeout=30))['text'])
+
+    async def frames(self):
+        """Every text frame the server sends, until the socket closes."""
+        while True:
+            output = await self.receive_output(timeout=None)
+            if output['type'] != 'websocket.send':
+                return
+            yield json.loads(output['text'])
+
+    async def close(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        try:
+            await self.wait(timeout=5)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+def backfill_last_messages(apps, schema_editor):
+    """Point both sides of every existing conversation at its latest message."""
+    Message = apps.get_model('chat', 'Message')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    latest = {}
+    for sender_id, receiver_id, last_id in (
+        Message.objects.values('sender_id', 'receiver_id')
+        .annotate(last_id=models.Max('id')).values_list('sender_id', 'receiver_id', 'last_id')
+    ):
+        pair = tuple(sorted((sender_id, receiver_id)))
+        latest[pair] = max(latest.get(pair, 0), last_id)
+
+    messages = Message.objects.in_bulk(list(latest.values()))
+    summaries = []
+    for (low, high), last_id in latest.items():
+        if low == high:
+            continue
+        message = messages[last_id]
+        for user_id, friend_id in ((low, high), (high, low)):
+            summaries.append(ConversationSummary(
+                user_id=user_id, friend_id=friend_id,
+                last_message_id=message.id, last_message_at=message.timestamp,
+            ))
+    ConversationSummary.objects.bulk_create(
+        summaries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user', 'friend'],
+        update_fields=['last_message', 'last_message_at'],
+    )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_inbox_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_last_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+
+
+def cursors_from_read_flags(apps, schema_editor):
+    """
+    Start each side's cursor just below the first unread message from the friend
+    (or at the friend's latest message when everything is read), then count what
+    lies past it.
+    """
+    Message = apps.get_model('chat', 'Message')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    first_unread = {
+        (receiver_id, sender_id): first_id
+        for receiver_id, sender_id, first_id in Message.objects.filter(is_read=False)
+        .values('receiver_id', 'sender_id').annotate(first_id=models.Min('id'))
+        .values_list('receiver_id', 'sender_id', 'first_id')
+    }
+    last_received = {
+        (receiver_id, sender_id): last_id
+        for receiver_id, sender_id, last_id in Message.objects
+        .values('receiver_id', 'sender_id').annotate(last_id=models.Max('id'))
+        .values_list('receiver_id', 'sender_id', 'last_id')
+    }
+
+    summaries = list(ConversationSummary.objects.all())
+    for summary in summaries:
+        side = (summary.user_id, summary.friend_id)
+        if side in first_unread:
+            summary.last_read_id = first_unread[side] - 1
+        else:
+            summary.last_read_id = last_received.get(side, 0)
+        summary.unread_count = Message.objects.filter(
+            receiver_id=summary.user_id, sender_id=summary.friend_id, id__gt=summary.last_read_id
+        ).count()
+    ConversationSummary.objects.bulk_update(summaries, ['last_read_id', 'unread_count'], batch_size=1000)
+
+
+def read_flags_from_cursors(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    for user_id, friend_id, last_read_id in ConversationSummary.objects.values_list('user_id', 'friend_id', 'last_read_id'):
+        Message.objects.filter(receiver_id=user_id, sender_id=friend_id, id__lte=last_read_id).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_backfill_inbox_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationsummary',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', 'id'], name='message_pair_id_idx'),
+        ),
+        migrations.RunPython(cursors_from_read_flags, read_flags_from_cursors),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-19 01:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Keep Message.search_vector in sync with the text on every insert and edit,
+# including bulk_create, without a second write from the application.
+CREATE_TRIGGER = """
+CREATE TRIGGER chat_message_search_vector_update
+BEFORE INSERT OR UPDATE OF message ON chat_message
+FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.english', message);
+UPDATE chat_message SET search_vector = to_tsvector('pg_catalog.english', message);
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS chat_message_search_vector_update ON chat_message;"
+
+
+class AddIndexOnPostgres(migrations.AddIndex):
+    """GIN indexes only exist on PostgreSQL; other backends (SQLite tests) skip them."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class RunSQLOnPostgres(migrations.RunSQL):
+    """The search trigger is PostgreSQL only; elsewhere search falls back to a LIKE scan."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_remove_message_is_read'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        RunSQLOnPostgres(CREATE_TRIGGER, DROP_TRIGGER),
+        AddIndexOnPostgres(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_gin'),
+        ),
+    ]
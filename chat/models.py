@@ -1,17 +1,67 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from core.models import User
 
-# Create your models here.
-# Messages Table
+# Messages Table (recent messages; see ArchivedMessage)
 class Message(models.Model):
     sender = models.ForeignKey(User, related_name='sent_messages', on_delete=models.CASCADE)
     receiver = models.ForeignKey(User, related_name='received_messages', on_delete=models.CASCADE)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+    # Filled by a database trigger on PostgreSQL (see migration 0008); unused elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
-        ordering = ('timestamp',)
+        # No default ordering: every read orders explicitly, so unordered queries skip the sort
+        indexes = [
+            # Conversation history, probed once per direction
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='message_pair_ts_idx'),
+            # Messages from a friend past the reader's cursor (unread counts)
+            models.Index(fields=['sender', 'receiver', 'id'], name='message_pair_id_idx'),
+            # Full-text message search
+            GinIndex(fields=['search_vector'], name='message_search_gin'),
+        ]
 
     def __str__(self):
-        return f"From {self.sender} to {self.receiver}: {self.message[:20]}..."
\ No newline at end of file
+        return f"From {self.sender} to {self.receiver}: {self.message[:20]}..."
+
+
+# Cold storage for messages older than settings.CHAT_HOT_DAYS, moved by `manage.py archive_messages`.
+# Rows keep their original ids, so keyset cursors and read cursors carry across both tables.
+class ArchivedMessage(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    receiver = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    message = models.TextField()
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='archived_pair_ts_idx'),
+        ]
+
+
+# One row per side of a conversation: the latest message and how far `user` has read.
+# Every message up to last_read_id is read; unread_count counts the friend's messages past it.
+class ConversationSummary(models.Model):
+    user = models.ForeignKey(User, related_name='conversation_summaries', on_delete=models.CASCADE)
+    friend = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_id = models.BigIntegerField(default=0)
+    last_message = models.ForeignKey(Message, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    has_archive = models.BooleanField(default=False)  # some of the conversation lives in ArchivedMessage
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'friend'], name='conversation_summary_unique_side'),
+        ]
+        indexes = [
+            # The inbox: a user's conversations, most recent first
+            models.Index(
+                fields=['user', '-last_message_at', '-id'],
+                condition=models.Q(last_message_at__isnull=False),
+                name='conversation_inbox_idx',
+            ),
+        ]
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+# Presence lives only in the cache (Redis); nothing here touches the database.
+# Each open socket holds one of the user's slots, a key naming the socket that
+# expires unless the socket's heartbeat renews it. A user is online while any
+# slot is live, so a lapsed key costs only the socket that failed to renew it.
+PRESENCE_TTL = 60                  # seconds a slot survives without a heartbeat
+HEARTBEAT_INTERVAL = 25            # clients ping this often; writes are coalesced to one per interval
+LAST_SEEN_TTL = 60 * 60 * 24 * 30  # keep "last seen" for a month
+PRESENCE_SLOTS = 8                 # sockets tracked per user; more than that are online through the others
+
+
+def _slot_key(user_id, slot):
+    # Holds the id of the socket that claimed the slot
+    return f"presence:{user_id}:{slot}"
+
+
+def _slot_keys(user_id):
+    return [_slot_key(user_id, slot) for slot in range(PRESENCE_SLOTS)]
+
+
+def _last_seen_key(user_id):
+    return f"last_seen:{user_id}"
+
+
+async def _claim(user_id, socket_id):
+    """The first free slot, taken atomically for the socket, or None if all are held."""
+    for slot in range(PRESENCE_SLOTS):
+        if await cache.aadd(_slot_key(user_id, slot), socket_id, PRESENCE_TTL):
+            return slot
+    return None
+
+
+async def _live_slots(user_id):
+    keys = _slot_keys(user_id)
+    values = await cache.aget_many(keys)
+    return [slot for slot, key in enumerate(keys) if key in values]
+
+
+async def connect(user_id, socket_id):
+    """
+    Claim a slot for a new socket. Returns (slot, whether the user just came
+    online). Two sockets connecting at once may both report coming online;
+    a repeated announcement is harmless, a missed one is not.
+    """
+    slot = await _claim(user_id, socket_id)
+    if slot is None:
+        return None, False
+    return slot, min(await _live_slots(user_id)) == slot
+
+
+async def heartbeat(user_id, socket_id, slot):
+    """Renew the socket's slot, claiming a new one if it lapsed or was taken over. Returns the slot."""
+    if slot is not None and await cache.aget(_slot_key(user_id, slot)) == socket_id:
+        await cache.atouch(_slot_key(user_id, slot), PRESENCE_TTL)
+        return slot
+    return await _claim(user_id, socket_id)
+
+
+async def disconnect(user_id, socket_id, slot):
+    """Release the socket's slot. Returns the last-seen time when no other socket is live, else None."""
+    if slot is not None and await cache.aget(_slot_key(user_id, slot)) == socket_id:
+        await cache.adelete(_slot_key(user_id, slot))
+    if await _live_slots(user_id):
+        return None
+    last_seen = timezone.now().isoformat()
+    await cache.aset(_last_seen_key(user_id), last_seen, LAST_SEEN_TTL)
+    return last_seen
+
+
+def _presence(user_ids, values):
+    return {
+        user_id: {
+            'online': any(key in values for key in _slot_keys(user_id)),
+            'last_seen': values.get(_last_seen_key(user_id)),
+        }
+        for user_id in user_ids
+    }
+
+
+def _keys(user_ids):
+    return [key for user_id in user_ids for key in (*_slot_keys(user_id), _last_seen_key(user_id))]
+
+
+def get_presence(user_ids):
+    """Online flag and last-seen time for many users in a single cache round trip."""
+    user_ids = list(user_ids)
+    return _presence(user_ids, cache.get_many(_keys(user_ids)))
+
+
+async def aget_presence(user_ids):
+    user_ids = list(user_ids)
+    return _presence(user_ids, await cache.aget_many(_keys(user_ids)))
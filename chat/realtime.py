@@ -0,0 +1,57 @@
+from channels.layers import get_channel_layer
+
+# Every frame on the per-user socket is {"type": ..., "data": {...}}, plus "ref"
+# when it answers a client frame that carried one.
+
+
+def user_group(user_id):
+    """The personal group every socket of a user subscribes to."""
+    return f"user_{user_id}"
+
+
+def room_group(user_id, friend_id):
+    """The group of the legacy per-conversation socket (ws/chat/<friend_id>/)."""
+    low, high = sorted((int(user_id), int(friend_id)))
+    return f"chat_chat_{low}_{high}"
+
+
+def envelope(kind, data, ref=None):
+    frame = {'type': kind, 'data': data}
+    if ref is not None:
+        frame['ref'] = ref
+    return frame
+
+
+def message_payload(message):
+    return {
+        'id': message.id,
+        'sender': message.sender_id,
+        'receiver': message.receiver_id,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': False,
+    }
+
+
+async def push(user_ids, kind, data):
+    """Send one event to every open socket of the given users."""
+    channel_layer = get_channel_layer()
+    for user_id in user_ids:
+        await channel_layer.group_send(user_group(user_id), {'type': 'user.event', 'event': envelope(kind, data)})
+
+
+async def broadcast_message(message):
+    """Fan a saved message out to both participants and to the legacy conversation socket."""
+    await push({message.sender_id, message.receiver_id}, 'message.new', message_payload(message))
+    await get_channel_layer().group_send(room_group(message.sender_id, message.receiver_id), {
+        'type': 'chat_message',
+        'id': message.id,
+        'message': message.message,
+        'sender_id': message.sender_id,
+        'timestamp': message.timestamp.isoformat(),
+    })
+
+
+async def broadcast_read(user_id, friend_id, last_read_id):
+    """Tell the friend (and the reader's other devices) how far the user has read."""
+    await push({user_id, friend_id}, 'read', {'user_id': user_id, 'friend_id': friend_id, 'last_read_id': last_read_id})
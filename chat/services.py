@@ -0,0 +1,168 @@
+import re
+from collections import Counter
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Replace
+from django.utils.html import escape
+
+from core.counters import adjust_unread_messages, advance_read_cursor
+from .models import ConversationSummary, Message
+
+SEARCH_CONFIG = 'english'  # must match the search_vector trigger (chat migration 0008)
+SEARCH_PROJECTION = ('id', 'sender_id', 'receiver_id', 'timestamp', 'snippet', 'rank')
+SNIPPET_WORDS = 12
+# What django.utils.html.escape replaces, '&' first so entities are not escaped twice
+HTML_ENTITIES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#x27;'))
+
+
+def record_message(message):
+    """
+    Point both sides of the conversation at a newly saved message and bump the
+    receiver's unread count. Call inside the transaction that saved the message.
+    """
+    record_messages([message])
+
+
+def record_messages(messages):
+    """
+    record_message for a batch: one summary insert, a forward-only summary
+    update per conversation side and one counter update per conversation.
+    """
+    latest, unread = {}, Counter()
+    for message in messages:
+        for side in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+            if side not in latest or (message.timestamp, message.id) > (latest[side].timestamp, latest[side].id):
+                latest[side] = message
+        unread[(message.receiver_id, message.sender_id)] += 1
+
+    ConversationSummary.objects.bulk_create(
+        [
+            ConversationSummary(user_id=user_id, friend_id=friend_id,
+                                last_message=message, last_message_at=message.timestamp)
+            for (user_id, friend_id), message in latest.items()
+        ],
+        ignore_conflicts=True,
+    )
+    for (user_id, friend_id), message in latest.items():
+        # Only ever forward: another batch for the conversation may have committed a newer message first
+        ConversationSummary.objects.filter(user_id=user_id, friend_id=friend_id).filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lt=message.timestamp)
+            | Q(last_message_at=message.timestamp, last_message_id__lt=message.id)
+        ).update(last_message=message, last_message_at=message.timestamp)
+    for (user_id, friend_id), count in unread.items():
+        adjust_unread_messages(user_id, friend_id, count)
+
+
+def persist_messages(messages):
+    """Insert messages and update their conversation summaries and unread counters atomically."""
+    with transaction.atomic():
+        Message.objects.bulk_create(messages)
+        record_messages(messages)
+    return messages
+
+
+def mark_conversation_read(user_id, friend_id, up_to=None):
+    """
+    Advance the user's read cursor in the conversation to message `up_to`
+    (default: the latest message). Returns the new cursor, or None if it did not move.
+    """
+    summary = ConversationSummary.objects.filter(user_id=user_id, friend_id=friend_id).values(
+        'last_message_id', 'last_read_id'
+    ).first()
+    if summary is None or summary['last_message_id'] is None:
+        return None
+    # Never past the latest message, so a bogus id cannot pre-read future messages
+    target = summary['last_message_id'] if up_to is None else min(int(up_to), summary['last_message_id'])
+    if target <= summary['last_read_id']:
+        return None
+    with transaction.atomic():
+        moved = advance_read_cursor(user_id, friend_id, target)
+    return target if moved else None
+
+
+def conversation_state(user_id, friend_id):
+    """
+    Read cursors for both sides ({user id: last read message id}) and whether
+    part of the conversation has been archived, in one query.
+    """
+    cursors = {int(user_id): 0, int(friend_id): 0}
+    has_archive = False
+    for side_user_id, last_read_id, archived in ConversationSummary.objects.filter(
+        user_id__in=[user_id, friend_id], friend_id__in=[user_id, friend_id]
+    ).values_list('user_id', 'last_read_id', 'has_archive'):
+        cursors[side_user_id] = last_read_id
+        has_archive = has_archive or archived
+    return cursors, has_archive
+
+
+def get_inbox(user_id):
+    """The user's conversations, most recent first, with the last message and unread count."""
+    return (
+        ConversationSummary.objects
+        .filter(user_id=user_id, last_message_at__isnull=False)
+        .select_related('friend', 'last_message')
+        .only(
+            'id', 'friend_id', 'unread_count', 'last_message_at',
+            'friend__username', 'friend__first_name', 'friend__last_name', 'friend__profile_picture',
+            'last_read_id', 'last_message__sender_id', 'last_message__message', 'last_message__timestamp',
+        )
+    )
+
+
+def search_messages(user_id, query, friend_id=None):
+    """
+    Rank the user's messages (sent or received, optionally with one friend) that
+    match the query. Returns dicts (SEARCH_PROJECTION), best first, with matches
+    wrapped in <mark> in an otherwise HTML-escaped snippet. On PostgreSQL this is served by the
+    search_vector GIN index; other databases fall back to a substring scan.
+    """
+    messages = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+    if friend_id is not None:
+        messages = messages.filter(Q(sender_id=friend_id) | Q(receiver_id=friend_id))
+    if connection.vendor != 'postgresql':
+        return _search_messages_python(messages, query)
+
+    search = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return messages.filter(search_vector=search).annotate(
+        rank=SearchRank(F('search_vector'), search),
+        snippet=SearchHeadline(
+            _html_escaped('message'), search, config=SEARCH_CONFIG, start_sel='<mark>', stop_sel='</mark>',
+            max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+        ),
+    ).order_by('-rank', '-id').values(*SEARCH_PROJECTION)
+
+
+def _html_escaped(field):
+    """The field's text with HTML special characters escaped, computed in SQL."""
+    expression = F(field)
+    for char, entity in HTML_ENTITIES:
+        expression = Replace(expression, Value(char), Value(entity))
+    return expression
+
+
+def _search_messages_python(messages, query):
+    terms = [term for term in query.split() if term]
+    if not terms:
+        return []
+    matches = Q()
+    for term in terms:
+        matches &= Q(message__icontains=term)
+    pattern = re.compile('(' + '|'.join(re.escape(term) for term in terms) + ')', re.IGNORECASE)
+
+    results = []
+    for message in messages.filter(matches).values('id', 'sender_id', 'receiver_id', 'timestamp', 'message'):
+        text = message.pop('message')
+        message['rank'] = float(len(pattern.findall(text)))
+        words = text.split()
+        first = next((i for i, word in enumerate(words) if pattern.search(word)), 0)
+        start = max(first - SNIPPET_WORDS // 2, 0)
+        # Split on the matches so only the message text is escaped, never the <mark> tags
+        parts = pattern.split(' '.join(words[start:start + SNIPPET_WORDS]))
+        message['snippet'] = ''.join(
+            f"<mark>{escape(part)}</mark>" if i % 2 else escape(part) for i, part in enumerate(parts)
+        )
+        results.append(message)
+    results.sort(key=lambda message: (-message['rank'], -message['id']))
+    return results
@@ -1,3 +1,449 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.authentication import JWTAuthMiddleware
+from core.models import Friendship, User
+from social.services import invalidate_friends
+
+from . import presence
+from .batching import MessageBatcher
+from .models import ArchivedMessage, ConversationSummary, Message
+from .routing import websocket_urlpatterns
+from .services import record_messages, search_messages
+
+
+class ChatTestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice", email="alice@example.com")
+        self.bob = User.objects.create(username="bob", email="bob@example.com")
+        low, high = sorted((self.alice.id, self.bob.id))
+        Friendship.objects.create(user_low_id=low, user_high_id=high, requester=self.alice, status="Accepted")
+        invalidate_friends(self.alice.id, self.bob.id)
+        self.client = self.client_for(self.alice)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def send(self, sender, receiver, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(sender).post(f"/api/messages/{receiver.id}/send/", {"message": text}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+
+class MessagePaginationTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent = [
+            Message.objects.create(sender=self.alice, receiver=self.bob, message=f"message {i}").id
+            for i in range(5)
+        ]
+
+    def test_newest_page_first(self):
+        response = self.client.get(f"/api/messages/{self.bob.id}/?limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['id'] for m in response.data['messages']], self.sent[3:])
+        self.assertTrue(response.data['has_more'])
+        self.assertIsNotNone(response.data['next_before'])
+
+    def test_before_cursor_walks_back_through_history(self):
+        seen, cursor = [], None
+        while True:
+            query = f"?limit=2&before={cursor}" if cursor else "?limit=2"
+            page = self.client.get(f"/api/messages/{self.bob.id}/{query}").data
+            seen = [m['id'] for m in page['messages']] + seen
+            if not page['has_more']:
+                break
+            cursor = page['next_before']
+        self.assertEqual(seen, self.sent)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"/api/messages/{self.bob.id}/?before=garbage")
+        self.assertEqual(response.status_code, 404)
+
+
+class FailingBatcher(MessageBatcher):
+    @staticmethod
+    def persist(messages):
+        raise RuntimeError("database unavailable")
+
+
+class MessageBatcherTests(ChatTestCase):
+    async def test_concurrent_saves_share_one_write(self):
+        batcher = MessageBatcher(max_size=10, max_delay=0.01)
+        saved = await asyncio.gather(*(
+            batcher.save(self.alice.id, self.bob.id, f"message {i}") for i in range(3)
+        ))
+
+        self.assertTrue(all(message.id for message in saved))
+        self.assertEqual(await Message.objects.filter(sender=self.alice).acount(), 3)
+        await asyncio.sleep(0)  # let the write's done-callback run
+        self.assertEqual(batcher.writes, set())
+
+    async def test_full_batch_flushes_immediately(self):
+        batcher = MessageBatcher(max_size=2, max_delay=60)
+        saved = await asyncio.wait_for(asyncio.gather(
+            batcher.save(self.alice.id, self.bob.id, "one"),
+            batcher.save(self.alice.id, self.bob.id, "two"),
+        ), timeout=5)
+        self.assertEqual([message.message for message in saved], ["one", "two"])
+
+    async def test_failed_write_reaches_every_sender_and_is_logged(self):
+        batcher = FailingBatcher(max_size=10, max_delay=0.01)
+        with self.assertLogs('chat.batching', level='ERROR'):
+            results = await asyncio.gather(
+                batcher.save(self.alice.id, self.bob.id, "one"),
+                batcher.save(self.alice.id, self.bob.id, "two"),
+                return_exceptions=True,
+            )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        await asyncio.sleep(0)
+        self.assertEqual(batcher.writes, set())
+
+
+class MessageSearchTests(ChatTestCase):
+    def test_snippet_escapes_message_text(self):
+        Message.objects.create(sender=self.bob, receiver=self.alice, message='dinner <script>alert("x")</script> & plans')
+
+        [result] = list(search_messages(self.alice.id, "dinner"))
+
+        self.assertIn('<mark>dinner</mark>', result['snippet'])
+        self.assertNotIn('<script>', result['snippet'])
+        self.assertIn('&lt;script&gt;', result['snippet'])
+
+    def test_only_own_conversations_match(self):
+        carol = User.objects.create(username="carol", email="carol@example.com")
+        Message.objects.create(sender=self.bob, receiver=carol, message="dinner plans")
+        self.assertEqual(list(search_messages(self.alice.id, "dinner")), [])
+
+
+class InboxTests(ChatTestCase):
+    def test_latest_conversation_first_with_unread_count(self):
+        carol = User.objects.create(username="carol", email="carol@example.com")
+        low, high = sorted((self.alice.id, carol.id))
+        Friendship.objects.create(user_low_id=low, user_high_id=high, requester=carol, status="Accepted")
+        invalidate_friends(self.alice.id, carol.id)
+
+        self.send(self.bob, self.alice, "hi")
+        self.send(self.bob, self.alice, "are you there?")
+        self.send(carol, self.alice, "lunch?")
+
+        inbox = self.client.get("/api/inbox/").data["results"]
+        self.assertEqual([entry["friend"]["username"] for entry in inbox], ["carol", "bob"])
+        self.assertEqual([entry["unread_count"] for entry in inbox], [1, 2])
+        self.assertEqual(inbox[1]["last_message"]["message"], "are you there?")
+
+    def test_own_messages_are_not_unread(self):
+        self.send(self.alice, self.bob, "hi")
+        [entry] = self.client.get("/api/inbox/").data["results"]
+        self.assertEqual(entry["unread_count"], 0)
+        self.assertEqual(entry["last_message"]["sender"], self.alice.id)
+
+    def test_batches_committing_out_of_order_keep_the_newest_message(self):
+        older = Message.objects.create(sender=self.bob, receiver=self.alice, message="older")
+        newer = Message.objects.create(sender=self.bob, receiver=self.alice, message="newer")
+        record_messages([newer])
+        record_messages([older])  # a batch that was flushed earlier but committed later
+
+        [entry] = self.client.get("/api/inbox/").data["results"]
+        self.assertEqual(entry["last_message"]["id"], newer.id)
+        self.assertEqual(entry["unread_count"], 2)
+        self.assertEqual(ConversationSummary.objects.get(user=self.bob).last_message_id, newer.id)
+
+    def test_only_friends_can_message(self):
+        carol = User.objects.create(username="carol", email="carol@example.com")
+        response = self.client.post(f"/api/messages/{carol.id}/send/", {"message": "hi"}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get("/api/inbox/").data["results"], [])
+
+
+class ReadCursorTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.send(self.bob, self.alice, "one")["id"]
+        self.second = self.send(self.bob, self.alice, "two")["id"]
+
+    def mark_read(self, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/messages/{self.bob.id}/mark-read/", data or {}, format="json")
+
+    def unread(self):
+        counters = self.client.get("/api/counters/").data["unread_messages"]
+        return counters["total"], counters["by_friend"]
+
+    def test_unread_counters_follow_the_cursor(self):
+        self.assertEqual(self.unread(), (2, {str(self.bob.id): 2}))
+
+        self.assertEqual(self.mark_read({"up_to": self.first}).data["last_read_id"], self.first)
+        self.assertEqual(self.unread(), (1, {str(self.bob.id): 1}))
+
+        self.assertEqual(self.mark_read().data["last_read_id"], self.second)
+        self.assertEqual(self.unread(), (0, {}))
+
+    def test_cursor_never_moves_back(self):
+        self.mark_read()
+        self.assertIsNone(self.mark_read({"up_to": self.first}).data["last_read_id"])
+        self.assertEqual(self.unread(), (0, {}))
+
+    def test_read_state_in_history(self):
+        self.mark_read({"up_to": self.first})
+        page = self.client.get(f"/api/messages/{self.bob.id}/").data
+        self.assertEqual([m["is_read"] for m in page["messages"]], [True, False])
+        self.assertEqual(page["last_read"][str(self.alice.id)], self.first)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.mark_read({"up_to": "latest"}).status_code, 400)
+
+
+class ArchiveTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent = [self.send(self.alice, self.bob, f"message {i}")['id'] for i in range(5)]
+        # The first three are old enough to archive
+        old = timezone.now() - timedelta(days=settings.CHAT_HOT_DAYS + 10)
+        for offset, message_id in enumerate(self.sent[:3]):
+            Message.objects.filter(id=message_id).update(timestamp=old + timedelta(minutes=offset))
+
+    def archive(self, *args):
+        call_command('archive_messages', *args, stdout=StringIO())
+
+    def test_old_messages_move_and_history_still_pages_through_them(self):
+        self.archive()
+        self.assertEqual(sorted(ArchivedMessage.objects.values_list('id', flat=True)), self.sent[:3])
+        self.assertEqual(sorted(Message.objects.values_list('id', flat=True)), self.sent[3:])
+
+        seen, cursor = [], None
+        while True:
+            query = f"?limit=2&before={cursor}" if cursor else "?limit=2"
+            page = self.client.get(f"/api/messages/{self.bob.id}/{query}").data
+            seen = [m['id'] for m in page['messages']] + seen
+            if not page['has_more']:
+                break
+            cursor = page['next_before']
+        self.assertEqual(seen, self.sent)
+
+    def test_latest_message_stays_hot(self):
+        Message.objects.update(timestamp=timezone.now() - timedelta(days=settings.CHAT_HOT_DAYS + 1))
+        self.archive()
+        self.assertEqual(list(Message.objects.values_list('id', flat=True)), [self.sent[-1]])
+        self.assertEqual(self.client.get("/api/inbox/").data["results"][0]["last_message"]["id"], self.sent[-1])
+
+    def test_days_cannot_undercut_the_hot_window(self):
+        with self.assertRaises(CommandError):
+            self.archive('--days', str(settings.CHAT_HOT_DAYS - 1))
+
+
+class LoadCommandTests(TransactionTestCase):
+    def test_load_test_delivers_every_message_and_cleans_up(self):
+        out = StringIO()
+        call_command('loadtest_chat', pairs=2, rate=40, duration=0.25, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['connections']['opened'], 4)
+        self.assertEqual(report['messages']['delivered'], report['messages']['sent'])
+        self.assertFalse(User.objects.exists())
+
+    def test_refuses_databases_that_are_not_test_databases(self):
+        with mock.patch('chat.management.load.is_test_database', return_value=False):
+            for command in ('loadtest_chat', 'bench_chat_consumer'):
+                with self.subTest(command=command), self.assertRaises(CommandError):
+                    call_command(command, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+
+class Socket(ApplicationCommunicator):
+    """A client WebSocket against an ASGI application."""
+
+    def __init__(self, application, path, query_string=b'', headers=(), subprotocols=()):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'query_string': query_string,
+            'headers': list(headers),
+            'subprotocols': list(subprotocols),
+        })
+
+    async def connect(self):
+        """(accepted, subprotocol)"""
+        await self.send_input({'type': 'websocket.connect'})
+        output = await self.receive_output(timeout=1)
+        return output['type'] == 'websocket.accept', output.get('subprotocol')
+
+    async def send_json_to(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json_from(self):
+        output = await self.receive_output(timeout=1)
+        return json.loads(output['text'])
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait(timeout=1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class SocketTestCase(ChatTestCase):
+    application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # presence lives in the cache
+        self.carol = User.objects.create(username="carol", email="carol@example.com")
+
+    def socket(self, path='/ws/user/', token=None, **kwargs):
+        if token is None and not kwargs:
+            token = str(AccessToken.for_user(self.alice))
+        if token is not None:
+            kwargs['query_string'] = f"token={token}".encode()
+        return Socket(self.application, path, **kwargs)
+
+    async def connect(self, user):
+        """A connected ws/user/ socket, past the counters and presence frames sent on connect."""
+        socket = self.socket(token=str(AccessToken.for_user(user)))
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await socket.receive_json_from())['type'], 'counters')
+        self.assertEqual((await socket.receive_json_from())['type'], 'presence')
+        return socket
+
+
+class SocketAuthenticationTests(SocketTestCase):
+    async def test_query_string_token(self):
+        socket = self.socket()
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        await socket.disconnect()
+
+    async def test_subprotocol_token_is_echoed_without_the_token(self):
+        socket = self.socket(subprotocols=['access_token', str(AccessToken.for_user(self.alice))])
+        connected, subprotocol = await socket.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'access_token')
+        await socket.disconnect()
+
+    async def test_authorization_header(self):
+        socket = self.socket(headers=[(b'authorization', f"Bearer {AccessToken.for_user(self.alice)}".encode())])
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        await socket.disconnect()
+
+    async def test_missing_or_invalid_token_is_refused(self):
+        for socket in (self.socket(headers=[]), self.socket(token='not-a-jwt')):
+            connected, _ = await socket.connect()
+            self.assertFalse(connected)
+
+    async def test_legacy_socket_only_between_friends(self):
+        connected, _ = await self.socket(f'/ws/chat/{self.bob.id}/').connect()
+        self.assertTrue(connected)
+        connected, _ = await self.socket(f'/ws/chat/{self.carol.id}/').connect()
+        self.assertFalse(connected)
+
+
+class UserSocketTests(SocketTestCase):
+    async def test_message_reaches_both_users_and_is_acknowledged(self):
+        alice, bob = await self.connect(self.alice), await self.connect(self.bob)
+        await alice.receive_json_from()  # bob came online
+
+        await alice.send_json_to({'type': 'message.send', 'ref': 7, 'data': {'to': self.bob.id, 'message': "hi"}})
+        frames = [await alice.receive_json_from(), await alice.receive_json_from()]
+        ack = next(frame for frame in frames if frame['type'] == 'message.ack')
+        self.assertEqual(ack['ref'], 7)
+        new = await bob.receive_json_from()
+        self.assertEqual((new['type'], new['data']['message'], new['data']['id']), ('message.new', "hi", ack['data']['id']))
+        self.assertTrue(await Message.objects.filter(id=ack['data']['id'], receiver=self.bob).aexists())
+
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_non_friends_and_bad_frames_get_errors(self):
+        alice = await self.connect(self.alice)
+        for frame in (
+            {'type': 'message.send', 'ref': 1, 'data': {'to': self.carol.id, 'message': "hi"}},
+            {'type': 'message.send', 'ref': 2, 'data': {'to': self.bob.id, 'message': "  "}},
+            {'type': 'shout', 'ref': 3},
+        ):
+            await alice.send_json_to(frame)
+            response = await alice.receive_json_from()
+            self.assertEqual((response['type'], response['ref']), ('error', frame['ref']))
+        await alice.send_json_to({'type': 'ping', 'ref': 4})
+        self.assertEqual(await alice.receive_json_from(), {'type': 'pong', 'data': {}, 'ref': 4})
+        self.assertFalse(await Message.objects.aexists())
+        await alice.disconnect()
+
+    async def test_rest_send_is_pushed_to_the_socket(self):
+        bob = await self.connect(self.bob)
+        data = await sync_to_async(self.send)(self.alice, self.bob, "over rest")
+        frame = await bob.receive_json_from()
+        self.assertEqual((frame['type'], frame['data']['id']), ('message.new', data['id']))
+        await bob.disconnect()
+
+
+class PresenceTests(SocketTestCase):
+    async def test_friends_see_online_and_last_seen(self):
+        alice = await self.connect(self.alice)
+        bob = await self.connect(self.bob)
+        online = await alice.receive_json_from()
+        self.assertEqual(online, {'type': 'presence', 'data': {'user_id': self.bob.id, 'online': True, 'last_seen': None}})
+
+        await bob.disconnect()
+        offline = await alice.receive_json_from()
+        self.assertFalse(offline['data']['online'])
+        self.assertIsNotNone(offline['data']['last_seen'])
+        await alice.disconnect()
+
+    async def test_second_device_does_not_announce_again(self):
+        alice = await self.connect(self.alice)
+        phone, laptop = await self.connect(self.bob), await self.connect(self.bob)
+        await alice.receive_json_from()
+        self.assertTrue(await alice.receive_nothing())
+        await laptop.disconnect()
+        self.assertTrue(await alice.receive_nothing())  # still online on the phone
+        await phone.disconnect()
+        self.assertFalse((await alice.receive_json_from())['data']['online'])
+        await alice.disconnect()
+
+    async def test_socket_that_outlives_a_lapsed_key_keeps_the_user_online(self):
+        alice = await self.connect(self.alice)
+        phone, laptop = await self.connect(self.bob), await self.connect(self.bob)
+        await alice.receive_json_from()
+
+        await cache.adelete_many([f"presence:{self.bob.id}:{slot}" for slot in range(presence.PRESENCE_SLOTS)])  # TTL lapsed
+        with mock.patch('chat.presence.HEARTBEAT_INTERVAL', 0):
+            await phone.send_json_to({'type': 'ping'})  # only the phone heartbeats
+            await phone.receive_json_from()
+        self.assertTrue(presence.get_presence([self.bob.id])[self.bob.id]['online'])
+
+        await laptop.disconnect()
+        self.assertTrue(await alice.receive_nothing())  # the phone is still connected
+        await phone.disconnect()
+        self.assertFalse((await alice.receive_json_from())['data']['online'])
+        await alice.disconnect()
+
+    async def test_typing_is_throttled(self):
+        alice, bob = await self.connect(self.alice), await self.connect(self.bob)
+        await alice.receive_json_from()
+        for _ in range(3):
+            await alice.send_json_to({'type': 'typing', 'data': {'to': self.bob.id}})
+        await alice.send_json_to({'type': 'typing', 'data': {'to': self.bob.id, 'typing': False}})
+
+        received = [await bob.receive_json_from(), await bob.receive_json_from()]
+        self.assertEqual([frame['data']['typing'] for frame in received], [True, False])
+        self.assertTrue(await bob.receive_nothing())
+        await alice.disconnect()
+        await bob.disconnect()
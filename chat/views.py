@@ -2,40 +2,110 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.authentication import StatelessJWTAuthentication
 from django.shortcuts import get_object_or_404
-from core.models import User, Friendship
+from core.models import User
 from .models import Message
-from core.serializers import MessageSerializer
+from core.serializers import ChatUserSerializer, InboxSerializer, MessagePageSerializer, MessageSerializer
+from core.pagination import InboxCursorPagination, MessageKeysetPagination, MessageSearchPagination
+from social.services import are_friends, get_friend_ids
+from .presence import get_presence
+from .delivery import deliver_message, deliver_read_receipt
+from .services import conversation_state, get_inbox, search_messages
+from .archive import archive_horizon, archived_conversation
 from django.db.models import Q
-from datetime import datetime
+
+class InboxView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """List the user's conversations, most recent first, with the last message and unread count"""
+        try:
+            paginator = InboxCursorPagination()
+            page = paginator.paginate_queryset(get_inbox(request.user.id), request, view=self)
+            serializer = InboxSerializer(page, many=True, context={"request": request})
+            return paginator.get_paginated_response(serializer.data)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class PresenceView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Online status and last-seen time of every friend, read from the cache only"""
+        try:
+            friends = get_presence(get_friend_ids(request.user.id))
+            return Response({str(user_id): state for user_id, state in friends.items()}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class MessageSearchView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Search the user's messages: ?q=dinner plans&friend_id=3&limit=20&offset=0"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "A search query (q) is required."}, status=status.HTTP_400_BAD_REQUEST)
+        friend_id = request.query_params.get("friend_id")
+        if friend_id is not None:
+            try:
+                friend_id = int(friend_id)
+            except ValueError:
+                return Response({"error": "friend_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            paginator = MessageSearchPagination()
+            page = paginator.paginate_queryset(search_messages(request.user.id, query, friend_id), request, view=self)
+            # Side-load everyone appearing on the page once
+            user_ids = {message['sender_id'] for message in page} | {message['receiver_id'] for message in page}
+            users = {
+                str(user.id): ChatUserSerializer(user, context={"request": request}).data
+                for user in User.objects.filter(id__in=user_ids).only(*ChatUserSerializer.Meta.fields)
+            }
+            response = paginator.get_paginated_response(page)
+            response.data["users"] = users
+            return response
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class MessageListView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, friend_id):
-        """Get all messages between the authenticated user and the specified friend"""
+        """
+        Get a page of messages between the authenticated user and the specified friend.
+        Newest page by default; ?before=<cursor> for older, ?after=<cursor> for newer, ?limit=50.
+        """
         friend = get_object_or_404(User, id=friend_id)
-        if not self.are_friends(request.user, friend):
+        if not are_friends(request.user.id, friend.id):
             return Response({"error": "You are not friends with this user."}, status=status.HTTP_403_FORBIDDEN)
 
         messages = Message.objects.filter(
             (Q(sender=request.user, receiver=friend) | Q(sender=friend, receiver=request.user))
-        ).order_by('timestamp')
+        ).defer('search_vector')
 
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        cursors, has_archive = conversation_state(request.user.id, friend.id)
+        # Only conversations that have been archived ever read the archive table
+        older = archived_conversation(request.user.id, friend.id) if has_archive else None
 
-    def are_friends(self, user1, user2):
-        """Check if two users are friends"""
-        return Friendship.objects.filter(
-            (Q(user=user1, friend=user2) | Q(user=user2, friend=user1)),
-            status="Accepted"
-        ).exists()
+        paginator = MessageKeysetPagination()
+        page = paginator.paginate_queryset(messages, request, view=self, older=older, horizon=archive_horizon())
+        serializer = MessagePageSerializer(page, many=True, context={"read_cursors": cursors})
+        # Only two people can appear in a conversation
+        users = {
+            str(user.id): ChatUserSerializer(user, context={"request": request}).data
+            for user in (request.user, friend)
+        }
+        last_read = {str(user_id): last_read_id for user_id, last_read_id in cursors.items()}
+        return paginator.get_paginated_response(serializer.data, users=users, last_read=last_read)
 
 class SendMessageView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, friend_id):
@@ -43,41 +113,36 @@ class SendMessageView(APIView):
         friend = get_object_or_404(User, id=friend_id)
         
         # Check if users are friends
-        if not Friendship.objects.filter(
-            (Q(user=request.user, friend=friend) | Q(user=friend, friend=request.user)),
-            status="Accepted"
-        ).exists():
+        if not are_friends(request.user.id, friend.id):
             return Response({"error": "You are not friends with this user."}, status=status.HTTP_403_FORBIDDEN)
 
         message_text = request.data.get('message')
         if not message_text or not message_text.strip():
             return Response({"error": "Message cannot be empty."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create and save the message
-        message = Message.objects.create(
-            sender=request.user,
-            receiver=friend,
-            message=message_text,
-            timestamp=datetime.now()
-        )
+        # Save the message and push it to both users' sockets
+        message = deliver_message(request.user, friend, message_text)
 
         serializer = MessageSerializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class MarkMessagesAsReadView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, friend_id):
-        """Mark all unread messages from a friend as read"""
+        """Mark messages from a friend as read, up to message `up_to` (default: all of them)"""
         friend = get_object_or_404(User, id=friend_id)
-        updated = Message.objects.filter(
-            receiver=request.user,
-            sender=friend,
-            is_read=False
-        ).update(is_read=True)
-        
+        up_to = request.data.get("up_to")
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return Response({"error": "up_to must be a message id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        last_read_id = deliver_read_receipt(request.user.id, friend.id, up_to)
+
         return Response({
             "status": "success",
-            "messages_updated": updated
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "last_read_id": last_read_id
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,51 @@
+import json
+
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import StatelessJWTAuthentication
+from .models import UserGone
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Base for endpoints with `async def` handlers, which DRF's APIView cannot
+    serve. Use it where a request waits on something slow (an LLM call), so
+    the wait does not hold a worker thread.
+
+    Behaves like the DRF views here with StatelessJWTAuthentication and
+    IsAuthenticated: request.user comes from the JWT without a query,
+    unauthenticated requests get a 401, and a JSON body is parsed into
+    request.data. Handlers return a JsonResponse or StreamingHttpResponse.
+    """
+    authentication = StatelessJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = self.authentication.authenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user, request.auth = auth
+
+        request.data = request.POST
+        if request.content_type == 'application/json' and request.body:
+            try:
+                request.data = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except UserGone:
+            detail = self.authentication.user_gone().detail
+            return JsonResponse({"detail": str(detail)}, status=status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,133 @@
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import LazyUser, UserGone
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the validated token claims instead of
+    loading the user row on every request.
+
+    request.user is a LazyUser carrying only the id; it can be used in ORM
+    filters and foreign key assignments without a query, and any other
+    attribute is filled from the short-lived user cache on first access.
+    As with any stateless JWT scheme, a deactivated user keeps access until
+    their access token expires. A token whose user has been deleted fails on
+    first attribute access with the model-level UserGone, which
+    exception_handler (and AsyncAPIView) turn into user_gone(): a 401.
+    """
+    user_gone_message = "User not found"
+
+    @classmethod
+    def user_gone(cls):
+        return AuthenticationFailed(cls.user_gone_message, code="user_not_found")
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        return LazyUser.from_db(None, ['id'], [user_id])
+
+
+def exception_handler(exc, context):
+    """DRF's handler, answering requests whose token user no longer exists with a 401."""
+    from rest_framework.views import exception_handler as drf_exception_handler  # imports this module's class
+
+    if isinstance(exc, UserGone):
+        exc = StatelessJWTAuthentication.user_gone()
+    return drf_exception_handler(exc, context)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connects from an access token, the same way
+    StatelessJWTAuthentication does for HTTP: no user or session query.
+
+    The token is read from, in order:
+      - the query string: ws/user/?token=<jwt>
+      - the subprotocols: new WebSocket(url, ["access_token", "<jwt>"]);
+        the accept then echoes "access_token" back, as browsers require
+      - an "Authorization: Bearer <jwt>" header (native clients)
+
+    scope["user"] is a LazyUser for the lifetime of the connection, or
+    AnonymousUser when the token is missing or invalid. Verified tokens are
+    remembered per worker until they expire, so a reconnect storm after a
+    deploy costs one dict lookup per socket.
+    """
+    SUBPROTOCOL = 'access_token'
+    VERIFIED_CACHE_SIZE = 10000
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.authentication = StatelessJWTAuthentication()
+        self.verified = OrderedDict()  # raw token -> (user id, expiry)
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, via_subprotocol = self.get_raw_token(scope)
+        user_id = self.verify(raw_token) if raw_token else None
+        scope['user'] = LazyUser.from_db(None, ['id'], [user_id]) if user_id is not None else AnonymousUser()
+
+        if via_subprotocol:
+            # Keep the token out of the subprotocols consumers see
+            scope['subprotocols'] = [p for p in scope['subprotocols'] if p != raw_token]
+            send = self.accept_subprotocol(send)
+        return await super().__call__(scope, receive, send)
+
+    def get_raw_token(self, scope):
+        """(token, whether it came in the subprotocols)."""
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            return token[0], False
+
+        subprotocols = scope.get('subprotocols') or []
+        if self.SUBPROTOCOL in subprotocols:
+            index = subprotocols.index(self.SUBPROTOCOL)
+            if index + 1 < len(subprotocols):
+                return subprotocols[index + 1], True
+
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                parts = value.split()
+                if len(parts) == 2 and parts[0].decode() in api_settings.AUTH_HEADER_TYPES:
+                    return parts[1].decode(), False
+        return None, False
+
+    def verify(self, raw_token):
+        """The user id of a valid access token, or None. Checks the signature only once per token."""
+        now = time.time()
+        hit = self.verified.get(raw_token)
+        if hit is not None:
+            user_id, expires = hit
+            if expires > now:
+                return user_id
+            del self.verified[raw_token]
+
+        try:
+            token = self.authentication.get_validated_token(raw_token)
+            user_id = token[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, TokenError, KeyError):
+            return None
+
+        self.verified[raw_token] = (user_id, token.get('exp', now))
+        if len(self.verified) > self.VERIFIED_CACHE_SIZE:
+            self.verified.popitem(last=False)
+        return user_id
+
+    def accept_subprotocol(self, send):
+        async def wrapped(message):
+            if message['type'] == 'websocket.accept' and not message.get('subprotocol'):
+                message = {**message, 'subprotocol': self.SUBPROTOCOL}
+            await send(message)
+        return wrapped
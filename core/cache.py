@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+USER_CACHE_TTL = 60  # seconds; bounds staleness after writes that skip invalidate_user()
+
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+
+def cached_user_fields():
+    """Attribute names kept in the user cache. The password hash never leaves the database."""
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+
+def get_user_row(user_id):
+    """Return the user's column values as a dict, from the cache when possible. None if the user is gone."""
+    key = _user_key(user_id)
+    row = cache.get(key)
+    if row is None:
+        row = get_user_model().objects.filter(pk=user_id).values(*cached_user_fields()).first()
+        if row is not None:
+            cache.set(key, row, USER_CACHE_TTL)
+    return row
+
+
+def invalidate_user(user_id):
+    """Drop the cached row after the user's profile changes."""
+    cache.delete(_user_key(user_id))
@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from chat.models import ConversationSummary, Message
+from .models import Friendship, Notification, UserCounters
+
+COUNTERS_CACHE_TTL = 60 * 60  # safety net; writes invalidate on commit
+
+
+def _counters_key(user_id):
+    return f"counters:{user_id}"
+
+
+def _invalidate_on_commit(*user_ids):
+    keys = [_counters_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _adjust(model, lookup, field, delta):
+    """Add delta to a counter row, creating it if needed. Never goes below zero."""
+    expression = Greatest(F(field) + delta, Value(0))
+    if model.objects.filter(**lookup).update(**{field: expression}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: max(delta, 0)})
+    except IntegrityError:
+        # Created concurrently; apply our delta to that row
+        model.objects.filter(**lookup).update(**{field: expression})
+
+
+def adjust_pending_requests(user_id, delta):
+    _adjust(UserCounters, {'user_id': user_id}, 'pending_friend_requests', delta)
+    _invalidate_on_commit(user_id)
+
+
+def adjust_unread_messages(user_id, friend_id, delta):
+    _adjust(ConversationSummary, {'user_id': user_id, 'friend_id': friend_id}, 'unread_count', delta)
+    _invalidate_on_commit(user_id)
+
+
+def advance_read_cursor(user_id, friend_id, last_read_id):
+    """
+    Move the user's read cursor forward to last_read_id and recount what the friend
+    sent past it, in a single row update. Returns False if the cursor was already there.
+    """
+    unread = (
+        Message.objects.filter(sender_id=friend_id, receiver_id=user_id, id__gt=last_read_id)
+        .order_by().values('receiver_id').annotate(unread=Count('id')).values('unread')
+    )
+    updated = ConversationSummary.objects.filter(
+        user_id=user_id, friend_id=friend_id, last_read_id__lt=last_read_id
+    ).update(last_read_id=last_read_id, unread_count=Coalesce(Subquery(unread), 0))
+    _invalidate_on_commit(user_id)
+    return bool(updated)
+
+
+def refresh_unread_notifications(user_id, create=True):
+    """
+    Recount the user's unread notifications. With create=False only an existing
+    counter row is updated: on the delete path the recipient may be mid-cascade,
+    and re-inserting their row would violate its foreign key.
+    """
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    if create:
+        UserCounters.objects.update_or_create(user_id=user_id, defaults={'unread_notifications': unread})
+    else:
+        UserCounters.objects.filter(user_id=user_id).update(unread_notifications=unread)
+    _invalidate_on_commit(user_id)
+
+
+def get_counters(user_id):
+    """Badge counts for the user: one cache lookup, rebuilt from the counter rows on a miss."""
+    key = _counters_key(user_id)
+    counters = cache.get(key)
+    if counters is None:
+        row = UserCounters.objects.filter(user_id=user_id).values(
+            'pending_friend_requests', 'unread_notifications'
+        ).first() or {'pending_friend_requests': 0, 'unread_notifications': 0}
+        by_friend = {
+            str(friend_id): unread
+            for friend_id, unread in ConversationSummary.objects.filter(
+                user_id=user_id, unread_count__gt=0
+            ).values_list('friend_id', 'unread_count')
+        }
+        counters = {
+            **row,
+            'unread_messages': {'total': sum(by_friend.values()), 'by_friend': by_friend},
+        }
+        cache.set(key, counters, COUNTERS_CACHE_TTL)
+    return counters
+
+
+def reconcile_counters(user_ids):
+    """Recompute the given users' counters from the source tables and overwrite the stored values."""
+    user_ids = list(user_ids)
+    pending = Counter()
+    for low, high, requester_id in Friendship.objects.filter(
+        Q(user_low_id__in=user_ids) | Q(user_high_id__in=user_ids), status="Pending"
+    ).values_list('user_low_id', 'user_high_id', 'requester_id'):
+        pending[high if requester_id == low else low] += 1
+    notifications = dict(
+        Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+        .values('recipient_id').annotate(unread=Count('id')).values_list('recipient_id', 'unread')
+    )
+    read_cursor = ConversationSummary.objects.filter(
+        user_id=OuterRef('receiver_id'), friend_id=OuterRef('sender_id')
+    ).values('last_read_id')[:1]
+    unread_messages = {
+        (receiver_id, sender_id): unread
+        for receiver_id, sender_id, unread in Message.objects.filter(receiver_id__in=user_ids)
+        .annotate(read_up_to=Coalesce(Subquery(read_cursor), 0)).filter(id__gt=F('read_up_to'))
+        .values('receiver_id', 'sender_id').annotate(unread=Count('id')).values_list('receiver_id', 'sender_id', 'unread')
+    }
+
+    with transaction.atomic():
+        UserCounters.objects.bulk_create(
+            [
+                UserCounters(user_id=user_id, pending_friend_requests=pending.get(user_id, 0),
+                             unread_notifications=notifications.get(user_id, 0))
+                for user_id in user_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['pending_friend_requests', 'unread_notifications'],
+        )
+        ConversationSummary.objects.filter(user_id__in=user_ids).update(unread_count=0)
+        ConversationSummary.objects.bulk_create(
+            [
+                ConversationSummary(user_id=receiver_id, friend_id=sender_id, unread_count=unread)
+                for (receiver_id, sender_id), unread in unread_messages.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'friend'],
+            update_fields=['unread_count'],
+        )
+        _invalidate_on_commit(*user_ids)
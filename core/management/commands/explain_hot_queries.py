@@ -0,0 +1,176 @@
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from agent.models import Conversation
+from chat.models import ConversationSummary, Message
+from chat.services import get_inbox, search_messages
+from core.models import (
+    Friendship, Hobby, Routine, RoutineActivityCompletion, Task, User, UserHobby, UserRoutine
+)
+
+PHRASES = ["hello", "see you at the gym", "running late, start without me", "dinner tonight?", "done with my tasks"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic dataset once the audit is done."""
+
+
+def is_test_database(settings_dict):
+    name = str(settings_dict['NAME'] or '')
+    if name == ':memory:' or 'mode=memory' in name:
+        return True  # SQLite's in-memory test database holds nothing worth protecting
+    return name.startswith(TEST_DATABASE_PREFIX) or name == settings_dict.get('TEST', {}).get('NAME')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset inside a transaction that is always rolled back, and assert "
+        "that the EXPLAIN plan of every hot lookup uses an index. Exits non-zero on a plan "
+        "regression. PostgreSQL only. Runs from core.tests against the test database when "
+        "PLAN_AUDIT=1 is set; refuses any other database unless --allow-non-test-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='Number of synthetic users to create.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic dataset.')
+        parser.add_argument('--allow-non-test-db', action='store_true',
+                            help='Seed (and roll back) inside a database that is not a test database.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Query plans are only audited on PostgreSQL.")
+        if not is_test_database(connection.settings_dict) and not options['allow_non_test_db']:
+            raise CommandError(
+                f"Refusing to seed {options['users']} users into '{connection.settings_dict['NAME']}', which is "
+                "not a test database. Run the core tests instead, or pass --allow-non-test-db."
+            )
+
+        self.verbosity = options['verbosity']
+        self.rng = random.Random(options['seed'])
+        failures = []
+        try:
+            with transaction.atomic():
+                users = self.seed(options['users'])
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                failures = self.audit(users)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot query plan(s) fell back to a sequential scan: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use index scans."))
+
+    def seed(self, user_count):
+        """Bulk-insert users with friendships, messages, routines, hobbies, tasks and agent conversations."""
+        self.stdout.write(f"Seeding {user_count} users...")
+        rng = self.rng
+        tag = rng.randrange(10 ** 9)
+        users = User.objects.bulk_create([
+            User(username=f"plan_{tag}_{i}", email=f"plan_{tag}_{i}@example.com", password="!")
+            for i in range(user_count)
+        ], batch_size=5000)
+        ids = [user.id for user in users]
+
+        friendships, seen = [], set()
+        for user_id in ids:
+            for friend_id in rng.sample(ids, 10):
+                pair = (min(user_id, friend_id), max(user_id, friend_id))
+                if user_id == friend_id or pair in seen:
+                    continue
+                seen.add(pair)
+                friendships.append(Friendship(user_low_id=pair[0], user_high_id=pair[1], requester_id=user_id,
+                                              status=rng.choice(["Accepted", "Accepted", "Accepted", "Pending"])))
+        Friendship.objects.bulk_create(friendships, batch_size=5000)
+
+        messages = []
+        for friendship in friendships[:len(friendships) // 2]:
+            for _ in range(10):
+                sender, receiver = rng.sample([friendship.user_low_id, friendship.user_high_id], 2)
+                messages.append(Message(sender_id=sender, receiver_id=receiver, message=rng.choice(PHRASES)))
+        Message.objects.bulk_create(messages, batch_size=5000)
+        ConversationSummary.objects.bulk_create([
+            ConversationSummary(user_id=user_id, friend_id=friend_id, last_message_at=timezone.now() - timedelta(minutes=rng.randint(0, 10000)),
+                                unread_count=rng.randint(0, 3))
+            for friendship in friendships[:len(friendships) // 2]
+            for user_id, friend_id in ((friendship.user_low_id, friendship.user_high_id),
+                                       (friendship.user_high_id, friendship.user_low_id))
+        ], batch_size=5000)
+
+        routines = Routine.objects.bulk_create([
+            Routine(start_date=date.today(), end_date=date.today() + timedelta(days=6), routine_data={})
+            for _ in ids
+        ], batch_size=5000)
+        user_routines = []
+        for user_id, routine in zip(ids, routines):
+            user_routines.append(UserRoutine(user_id=user_id, routine=routine, permission='Edit', is_primary=True))
+        for user_id in ids:
+            user_routines.append(UserRoutine(user_id=user_id, routine=rng.choice(routines), permission='View'))
+        UserRoutine.objects.bulk_create(user_routines, batch_size=5000, ignore_conflicts=True)
+
+        RoutineActivityCompletion.objects.bulk_create([
+            RoutineActivityCompletion(user_id=user_id, routine=routine, day=day, activity_name=f"Activity {n}",
+                                      activity_type="task", is_completed=rng.random() < 0.5)
+            for user_id, routine in zip(ids, routines) for day in DAYS[:3] for n in range(3)
+        ], batch_size=5000)
+
+        hobbies = Hobby.objects.bulk_create([Hobby(name=f"Hobby {tag} {n}", category="Synthetic") for n in range(200)])
+        UserHobby.objects.bulk_create([
+            UserHobby(user_id=user_id, hobby=hobby) for user_id in ids for hobby in rng.sample(hobbies, 3)
+        ], batch_size=5000)
+
+        Task.objects.bulk_create([
+            Task(user_id=user_id, task_name=f"Task {n}", priority="High", days_associated=rng.sample(DAYS, 2))
+            for user_id in ids for n in range(5)
+        ], batch_size=5000)
+
+        conversations = []
+        for user_id in ids:
+            conversations.append(Conversation(user_id=user_id, is_active=False))
+            conversations.append(Conversation(user_id=user_id, is_active=True))
+        Conversation.objects.bulk_create(conversations, batch_size=5000)
+
+        return users
+
+    def hot_queries(self, users):
+        """(name, queryset) pairs mirroring the lookups made by the API views."""
+        a, b = self.rng.sample(users, 2)
+        routine = UserRoutine.objects.filter(user=a, is_primary=True).first().routine
+        hobby = UserHobby.objects.filter(user=a).first().hobby
+        return [
+            ("primary routine", UserRoutine.objects.filter(user=a, is_primary=True)),
+            ("friendship check", Friendship.objects.between(a.id, b.id).filter(status="Accepted")),
+            ("friend list", Friendship.objects.involving(a.id).filter(status="Accepted")),
+            ("pending requests", Friendship.objects.involving(a.id).filter(status="Pending").exclude(requester=a)),
+            ("chat history", Message.objects.filter(
+                Q(sender=a, receiver=b) | Q(sender=b, receiver=a)).order_by('-timestamp', '-id')[:51]),
+            ("inbox", get_inbox(a.id).order_by('-last_message_at', '-id')[:20]),
+            ("unread past read cursor", Message.objects.filter(sender=b, receiver=a, id__gt=0).values('receiver_id')
+                .annotate(unread=Count('id'))),
+            ("message search", search_messages(a.id, "gym")),
+            ("routine completions", RoutineActivityCompletion.objects.filter(user=a, routine=routine)),
+            ("user hobby", UserHobby.objects.filter(user=a, hobby=hobby)),
+            ("active agent conversation", Conversation.objects.filter(user=a, is_active=True)),
+            ("tasks for a day", Task.objects.filter(user=a, days_associated__contains=["Wednesday"])),
+        ]
+
+    def audit(self, users):
+        failures = []
+        for name, queryset in self.hot_queries(users):
+            plan = queryset.explain()
+            uses_index = "Index" in plan and "Seq Scan" not in plan
+            label = self.style.SUCCESS("index") if uses_index else self.style.ERROR("SEQ SCAN")
+            self.stdout.write(f"[{label}] {name}")
+            if not uses_index or self.verbosity > 1:
+                self.stdout.write(plan)
+            if not uses_index:
+                failures.append(name)
+        return failures
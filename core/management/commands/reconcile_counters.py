@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_counters
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute badge counters (pending friend requests, unread messages, unread "
+        "notifications) from the source tables. Run periodically to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users reconciled per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            reconcile_counters(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters for {len(user_ids)} users."))
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 00:56
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_routineactivitycompletion_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'id'], name='task_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['days_associated'], name='task_days_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-19 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['user', 'friend', 'status'], name='friendship_user_friend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['friend', 'user', 'status'], name='friendship_friend_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(('status', 'Accepted')), fields=['user'], name='friendship_user_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(('status', 'Accepted')), fields=['friend'], name='friendship_friend_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(('status', 'Pending')), fields=['friend'], name='friendship_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhobby',
+            index=models.Index(fields=['user', 'hobby'], name='userhobby_user_hobby_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userroutine',
+            index=models.Index(condition=models.Q(('is_primary', True)), fields=['user'], name='userroutine_primary_idx'),
+        ),
+    ]
@@ -0,0 +1,129 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+STATUS_PRIORITY = {"Accepted": 0, "Pending": 1, "Rejected": 2}
+
+
+def canonicalize_edges(apps, schema_editor):
+    """Store each pair once as (low, high), keeping the strongest row when both directions exist."""
+    Friendship = apps.get_model('core', 'Friendship')
+    keep = {}
+    for friendship in Friendship.objects.order_by('created_at', 'id'):
+        pair = tuple(sorted((friendship.user_id, friendship.friend_id)))
+        kept = keep.get(pair)
+        if kept is None or STATUS_PRIORITY.get(friendship.status, 3) < STATUS_PRIORITY.get(kept.status, 3):
+            keep[pair] = friendship
+
+    kept_ids = {friendship.id for friendship in keep.values()}
+    Friendship.objects.exclude(id__in=kept_ids).delete()
+    Friendship.objects.filter(user=models.F('friend')).delete()
+
+    for (low, high), friendship in keep.items():
+        if low == high:
+            continue
+        friendship.requester_id = friendship.user_id
+        friendship.user_low_id = low
+        friendship.user_high_id = high
+        friendship.save(update_fields=['requester', 'user_low', 'user_high'])
+
+
+def restore_directed_edges(apps, schema_editor):
+    Friendship = apps.get_model('core', 'Friendship')
+    for friendship in Friendship.objects.all():
+        friendship.user_id = friendship.requester_id
+        friendship.friend_id = friendship.user_high_id if friendship.requester_id == friendship.user_low_id else friendship.user_low_id
+        friendship.save(update_fields=['user', 'friend'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_user_search_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='friendship',
+            name='friendship_user_friend_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='friendship',
+            name='friendship_friend_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='friendship',
+            name='friendship_user_accepted_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='friendship',
+            name='friendship_friend_accepted_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='friendship',
+            name='friendship_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='requester',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sent_friend_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='user_high',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='user_low',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        # Nullable so the reverse migration can re-add them before restoring values
+        migrations.AlterField(
+            model_name='friendship',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='friendships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='friendship',
+            name='friend',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='friends', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(canonicalize_edges, restore_directed_edges),
+        migrations.RemoveField(
+            model_name='friendship',
+            name='friend',
+        ),
+        migrations.RemoveField(
+            model_name='friendship',
+            name='user',
+        ),
+        migrations.AlterField(
+            model_name='friendship',
+            name='requester',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_friend_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='friendship',
+            name='user_high',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='friendship',
+            name='user_low',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['user_high', 'user_low'], name='friendship_high_low_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='friendship_unique_edge'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(condition=models.Q(('user_low__lt', models.F('user_high'))), name='friendship_ordered_edge'),
+        ),
+    ]
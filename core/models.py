@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
+from .cache import cached_user_fields, get_user_row
 
 
 # Custom User model
@@ -18,6 +21,14 @@ class User(AbstractUser):
         null=True
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Trigram indexes for user search (case-insensitive LIKE and similarity)
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), name='user_username_trgm'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='user_first_name_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='user_last_name_trgm'),
+        ]
+
     def __str__(self):
         return self.username
     
@@ -28,6 +39,36 @@ class User(AbstractUser):
             return self.profile_picture.url
         return None # Or return URL to a default image on the server
 
+
+class UserGone(Exception):
+    """A LazyUser's row no longer exists: the token outlived the account."""
+
+
+# User built from JWT claims alone (see core.authentication)
+class LazyUser(User):
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Fill every deferred field from the user cache at once instead of querying per field."""
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not set(fields) <= deferred & set(cached_user_fields()):
+            return super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+        row = get_user_row(self.pk)
+        if row is None:
+            # Not DoesNotExist, which serializers read as a null attribute; core.authentication answers 401
+            raise UserGone("User not found")
+        for attname in deferred:
+            if attname in row:
+                setattr(self, attname, row[attname])
+
+    def save(self, *args, **kwargs):
+        """Only named fields: the others may come from the user cache and would overwrite newer values."""
+        if kwargs.get('update_fields') is None:
+            raise ValueError("LazyUser.save() needs update_fields.")
+        return super().save(*args, **kwargs)
+
 # Hobbies Table
 class Hobby(models.Model):
     name = models.CharField(max_length=150)
@@ -43,6 +84,11 @@ class UserHobby(models.Model):
     hobby = models.ForeignKey(Hobby, on_delete=models.CASCADE, related_name="users")
     added_on = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'hobby'], name='userhobby_user_hobby_idx'),
+        ]
+
 
 # Routines Table
 class Routine(models.Model):
@@ -65,6 +111,10 @@ class UserRoutine(models.Model):
 
     class Meta:
         unique_together = ('user', 'routine')
+        indexes = [
+            # "the user's primary routine" lookup
+            models.Index(fields=['user'], condition=models.Q(is_primary=True), name='userroutine_primary_idx'),
+        ]
 
 class UserSetting(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="settings")
@@ -88,6 +138,12 @@ class Task(models.Model):
     is_fixed_time = models.BooleanField(default=False)  # Marks if task is fixed-time
     fixed_time_slot = models.TimeField(null=True, blank=True)  # Time slot for fixed tasks
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='task_user_id_idx'),  # keyset pagination per user
+            GinIndex(fields=['days_associated'], opclasses=['jsonb_path_ops'], name='task_days_gin'),  # day filter (@>)
+        ]
+
     def __str__(self):
         return self.task_name
 
@@ -117,9 +173,29 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+
+# Badge counters, maintained on write (see core.counters)
+class UserCounters(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="counters")
+    pending_friend_requests = models.PositiveIntegerField(default=0)
+    unread_notifications = models.PositiveIntegerField(default=0)
+
+class FriendshipQuerySet(models.QuerySet):
+    def between(self, user_id, other_id):
+        """The edge between two users, if any: a single probe of the unique (low, high) index."""
+        low, high = sorted((int(user_id), int(other_id)))
+        return self.filter(user_low_id=low, user_high_id=high)
+
+    def involving(self, user_id):
+        """Every edge touching the user."""
+        return self.filter(models.Q(user_low_id=user_id) | models.Q(user_high_id=user_id))
+
+
+# One row per pair of users, stored with the smaller id first
 class Friendship(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="friendships")
-    friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name="friends")
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_friend_requests")
     status = models.CharField(
         max_length=10,
         choices=[("Pending", "Pending"), ("Accepted", "Accepted"), ("Rejected", "Rejected")],
@@ -127,6 +203,31 @@ class Friendship(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = FriendshipQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='friendship_unique_edge'),
+            models.CheckConstraint(condition=models.Q(user_low__lt=models.F('user_high')), name='friendship_ordered_edge'),
+        ]
+        indexes = [
+            # Edges where the user is the higher id (the unique index serves the lower side)
+            models.Index(fields=['user_high', 'user_low'], name='friendship_high_low_idx'),
+        ]
+
+    @classmethod
+    def request(cls, requester, recipient):
+        """Build a pending edge from requester to recipient."""
+        low, high = sorted((requester.id, recipient.id))
+        return cls(user_low_id=low, user_high_id=high, requester=requester, status="Pending")
+
+    @property
+    def recipient_id(self):
+        return self.user_high_id if self.requester_id == self.user_low_id else self.user_low_id
+
+    def other_user_id(self, user_id):
+        return self.user_high_id if self.user_low_id == user_id else self.user_low_id
+
 class RoutineActivityCompletion(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     routine = models.ForeignKey(Routine, on_delete=models.CASCADE)
@@ -0,0 +1,122 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+
+
+class TaskCursorPagination(CursorPagination):
+    """Keyset pagination over a user's tasks, newest id last."""
+    ordering = 'id'  # unique, so the cursor is a pure "id > last seen" seek
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
+class InboxCursorPagination(CursorPagination):
+    """Conversations by recency; the id tie-break keeps the cursor stable."""
+    ordering = ('-last_message_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 50
+
+
+class UserSearchPagination(LimitOffsetPagination):
+    """Offset pages over ranked search results; a rank is not a stable keyset."""
+    default_limit = 20
+    max_limit = 50
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pages over a conversation, ordered by (timestamp, id).
+
+    With no cursor the newest page is returned; `before` walks back through
+    history and `after` fetches anything newer than what the client has.
+    Every page is a single index seek, however long the conversation.
+    """
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def encode_cursor(self, message):
+        position = f"{message.timestamp.isoformat()}|{message.id}"
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timestamp, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            timestamp = datetime.fromisoformat(timestamp)
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            return timestamp, int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None, older=None, horizon=None):
+        """
+        `older` optionally continues the conversation in another table (the
+        archive) holding only rows from before `horizon`; it is read only when a
+        page runs past the end of `queryset` or starts before the horizon.
+        """
+        size = self.get_page_size(request)
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        self.forward = bool(after) and not before
+
+        if self.forward:
+            timestamp, pk = self.decode_cursor(after)
+            seek = Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            sources = [queryset]
+            if older is not None and (horizon is None or timestamp < horizon):
+                sources.insert(0, older)
+            order = ('timestamp', 'id')
+        else:
+            seek = Q()
+            if before:
+                timestamp, pk = self.decode_cursor(before)
+                seek = Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+            sources = [queryset] if older is None else [queryset, older]
+            order = ('-timestamp', '-id')
+
+        # One extra row tells us whether another page exists
+        page = []
+        for source in sources:
+            page += list(source.filter(seek).order_by(*order)[:size + 1 - len(page)])
+            if len(page) > size:
+                break
+        self.has_more = len(page) > size
+        page = page[:size]
+        if not self.forward:
+            page.reverse()  # always hand back oldest first
+
+        self.next_before = self.encode_cursor(page[0]) if page and (self.forward or self.has_more) else None
+        self.next_after = self.encode_cursor(page[-1]) if page else after
+        return page
+
+    def get_paginated_response(self, data, users=None, last_read=None):
+        return Response({
+            'messages': data,
+            'users': users or {},
+            'last_read': last_read or {},
+            'has_more': self.has_more,
+            'next_before': self.next_before,
+            'next_after': self.next_after,
+        })
+
+
+class MessageSearchPagination(LimitOffsetPagination):
+    """Offset pages over ranked message matches."""
+    default_limit = 20
+    max_limit = 50
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import Task, User, Friendship
-from chat.models import Message
+from chat.models import ConversationSummary, Message
 
 
 class SignupSerializer(serializers.ModelSerializer):
@@ -32,10 +32,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'first_name', 'last_name', 'username', 'email', 'profile_picture']  # Include necessary fields
 
 class FriendshipSerializer(serializers.ModelSerializer):
-    sender_username = serializers.CharField(source="user.username", read_only=True)
-    first_name = serializers.CharField(source="user.first_name", read_only=True)
-    last_name = serializers.CharField(source="user.last_name", read_only=True)
-    profile_picture = serializers.CharField(source="user.profile_picture", read_only=True)
+    # Friendships are stored as canonical (low, high) edges; expose them directed, sender first
+    user = serializers.IntegerField(source="requester_id", read_only=True)
+    friend = serializers.IntegerField(source="recipient_id", read_only=True)
+    sender_username = serializers.CharField(source="requester.username", read_only=True)
+    first_name = serializers.CharField(source="requester.first_name", read_only=True)
+    last_name = serializers.CharField(source="requester.last_name", read_only=True)
+    profile_picture = serializers.CharField(source="requester.profile_picture", read_only=True)
 
     class Meta:
         model = Friendship
@@ -48,7 +51,19 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = '__all__'
 
-class MessageSerializer(serializers.ModelSerializer):
+# Serializer for bulk task writes; the owner comes from the URL, not the payload
+class BulkTaskSerializer(TaskSerializer):
+    class Meta(TaskSerializer.Meta):
+        read_only_fields = ['user']
+
+class ReadStateMixin(serializers.Serializer):
+    # Read state comes from the receiver's read cursor, passed as context["read_cursors"]
+    is_read = serializers.SerializerMethodField()
+
+    def get_is_read(self, message):
+        return message.id <= self.context.get("read_cursors", {}).get(message.receiver_id, 0)
+
+class MessageSerializer(ReadStateMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     receiver = UserSerializer(read_only=True)
 
@@ -56,6 +71,30 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['id', 'sender', 'receiver', 'message', 'timestamp', 'is_read']
 
+# Chat history pages: participants are ids, side-loaded once per page
+class MessagePageSerializer(ReadStateMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'receiver', 'message', 'timestamp', 'is_read']
+
+class ChatUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'profile_picture']
+
+class InboxMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'message', 'timestamp']
+
+class InboxSerializer(serializers.ModelSerializer):
+    friend = ChatUserSerializer(read_only=True)
+    last_message = InboxMessageSerializer(read_only=True)
+
+    class Meta:
+        model = ConversationSummary
+        fields = ['id', 'friend', 'last_message', 'last_message_at', 'unread_count', 'last_read_id']
+
 class ProfilePictureSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .counters import refresh_unread_notifications
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_notifications(sender, instance, **kwargs):
+    refresh_unread_notifications(instance.recipient_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_notifications_on_delete(sender, instance, **kwargs):
+    # May run inside the recipient's own delete cascade; never recreate their counter row
+    refresh_unread_notifications(instance.recipient_id, create=False)
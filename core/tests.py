@@ -1,3 +1,196 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .counters import get_counters
+from .management.commands.explain_hot_queries import is_test_database
+from .models import LazyUser, Notification, Task, User, UserCounters, UserGone
+
+
+class NotificationCounterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="alice", email="alice@example.com")
+
+    def test_counter_follows_notifications(self):
+        first = Notification.objects.create(recipient=self.user, content="a")
+        Notification.objects.create(recipient=self.user, content="b")
+        self.assertEqual(UserCounters.objects.get(user=self.user).unread_notifications, 2)
+
+        first.delete()
+        self.assertEqual(UserCounters.objects.get(user=self.user).unread_notifications, 1)
+
+    def test_deleting_user_with_notifications(self):
+        Notification.objects.create(recipient=self.user, content="a")
+        Notification.objects.create(recipient=self.user, content="b")
+
+        self.user.delete()
+
+        self.assertFalse(User.objects.filter(username="alice").exists())
+        self.assertFalse(UserCounters.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_counters_default_to_zero(self):
+        counters = get_counters(self.user.id)
+        self.assertEqual(counters['unread_notifications'], 0)
+        self.assertEqual(counters['unread_messages']['total'], 0)
+
+
+class APITestCase(TestCase):
+    """Requests authenticated as alice."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="alice", email="alice@example.com", first_name="Alice")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+
+class StatelessAuthenticationTests(APITestCase):
+
+    def test_user_fields_load_lazily(self):
+        user = LazyUser.from_db(None, ['id'], [self.user.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, "alice")
+            self.assertEqual(user.first_name, "Alice")  # filled by the same load
+        with self.assertNumQueries(0):
+            self.assertEqual(LazyUser.from_db(None, ['id'], [self.user.id]).email, "alice@example.com")
+
+    def test_deleted_user_is_a_model_error(self):
+        user = LazyUser.from_db(None, ['id'], [self.user.id])
+        self.user.delete()
+        cache.clear()
+        with self.assertRaises(UserGone):
+            user.username
+
+    def test_token_of_deleted_user_gets_401(self):
+        self.assertEqual(self.client.get("/api/users/details/").status_code, 200)
+        self.user.delete()
+        cache.clear()
+        response = self.client.get("/api/users/details/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'].code, "user_not_found")
+
+
+    def test_save_needs_named_fields(self):
+        with self.assertRaises(ValueError):
+            LazyUser.from_db(None, ['id'], [self.user.id]).save()
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_upload_keeps_columns_changed_since_the_user_was_cached(self):
+        self.assertEqual(self.client.get("/api/users/details/").data['first_name'], "Alice")  # cached now
+        User.objects.filter(id=self.user.id).update(first_name="Alicia")
+
+        picture = SimpleUploadedFile("me.png", b"not really a png", content_type="image/png")
+        response = self.client.put("/api/upload-pfp/", {"profile_picture": picture}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Alicia")
+        self.assertTrue(self.user.profile_picture.name.startswith("profile_pics/"))
+
+
+class HotQueryPlanTests(TestCase):
+    def test_only_test_databases_are_seeded(self):
+        self.assertTrue(is_test_database({'NAME': 'test_flexiplan'}))
+        self.assertTrue(is_test_database({'NAME': 'ci_plans', 'TEST': {'NAME': 'ci_plans'}}))
+        self.assertTrue(is_test_database({'NAME': 'file:memorydb_default?mode=memory&cache=shared'}))
+        self.assertFalse(is_test_database({'NAME': 'flexiplan', 'TEST': {}}))
+
+    @tag('slow')
+    @skipUnless(os.environ.get('PLAN_AUDIT'), "a few minutes; opt in with PLAN_AUDIT=1")
+    @skipUnless(connection.vendor == 'postgresql', "query plans are audited on PostgreSQL")
+    def test_hot_queries_use_indexes(self):
+        # Seeds 20k users into the test database and rolls them back
+        call_command('explain_hot_queries', verbosity=0)
+
+
+class UserTasksBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.gym = Task.objects.create(user=self.user, task_name="Gym", priority="High")
+        self.read = Task.objects.create(user=self.user, task_name="Read", priority="Low")
+
+    def bulk(self, operations):
+        return self.client.post(f"/api/users/{self.user.id}/tasks/bulk/", {"operations": operations}, format="json")
+
+    def test_applies_every_operation(self):
+        response = self.bulk([
+            {"action": "create", "data": {"task_name": "Cook", "priority": "Medium"}},
+            {"action": "update", "id": self.gym.id, "data": {"priority": "Low"}},
+            {"action": "delete", "id": self.read.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task["task_name"] for task in response.data["created"]], ["Cook"])
+        self.assertEqual(response.data["deleted"], [self.read.id])
+        self.assertEqual(
+            sorted(Task.objects.filter(user=self.user).values_list("task_name", "priority")),
+            [("Cook", "Medium"), ("Gym", "Low")],
+        )
+
+    def test_invalid_operation_writes_nothing(self):
+        response = self.bulk([
+            {"action": "create", "data": {"task_name": "Cook", "priority": "Medium"}},
+            {"action": "update", "id": 999999, "data": {"priority": "Low"}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["index"], 1)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+
+    def test_task_changed_twice_is_rejected(self):
+        for second in ({"action": "delete"}, {"action": "update", "data": {"priority": "Medium"}}):
+            with self.subTest(second=second["action"]):
+                response = self.bulk([
+                    {"action": "update", "id": self.gym.id, "data": {"priority": "Low"}},
+                    {**second, "id": self.gym.id},
+                ])
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual([error["index"] for error in response.data["errors"]], [1])
+                self.gym.refresh_from_db()
+                self.assertEqual(self.gym.priority, "High")
+
+
+class UserTasksListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = Task.objects.bulk_create([
+            Task(user=self.user, task_name="Gym", priority="High", days_associated=["Monday", "Wednesday"]),
+            Task(user=self.user, task_name="Read", priority="Low", days_associated=["Wednesday"], is_fixed_time=True),
+            Task(user=self.user, task_name="Cook", priority="High", days_associated=["Friday"]),
+        ])
+        other = User.objects.create(username="bob", email="bob@example.com")
+        Task.objects.create(user=other, task_name="Swim", priority="High", days_associated=["Wednesday"])
+
+    def names(self, query=""):
+        response = self.client.get(f"/api/users/{self.user.id}/tasks/{query}")
+        self.assertEqual(response.status_code, 200)
+        return [task["task_name"] for task in response.data]
+
+    def test_unpaginated_list(self):
+        self.assertEqual(self.names(), ["Gym", "Read", "Cook"])
+
+    def test_filters(self):
+        self.assertEqual(self.names("?day=wednesday"), ["Gym", "Read"])
+        self.assertEqual(self.names("?priority=high"), ["Gym", "Cook"])
+        self.assertEqual(self.names("?is_fixed_time=true"), ["Read"])
+        self.assertEqual(self.names("?day=Wednesday&priority=High"), ["Gym"])
+
+    def test_invalid_filters(self):
+        for query in ("?day=Someday", "?priority=urgent", "?is_fixed_time=maybe"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/api/users/{self.user.id}/tasks/{query}").status_code, 400)
+
+    def test_cursor_pages(self):
+        url, names = f"/api/users/{self.user.id}/tasks/?limit=2", []
+        while url:
+            page = self.client.get(url).data
+            names += [task["task_name"] for task in page["results"]]
+            url = page["next"]
+        self.assertEqual(names, ["Gym", "Read", "Cook"])
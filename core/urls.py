@@ -1,14 +1,15 @@
 from django.urls import path
 from .views import (
     MarkActivityCompletedView, RefreshTokenView, RemoveActivityFromRoutineView,
-    SignupView, LoginView, UserRoutineView, UserTaskDetailView, UserTasksView,
-    UploadUserPfp, FriendsListView
+    SignupView, LoginView, UserRoutineView, UserTaskDetailView, UserTasksView, UserTasksBulkView,
+    UploadUserPfp, FriendsListView, CountersView
 )
 urlpatterns = [
     path('signup/', SignupView.as_view(), name='signup'),
     path('login/', LoginView.as_view(), name='login'),
     path('refresh-token/', RefreshTokenView.as_view(), name='refresh-token'),
     path('users/<int:user_id>/tasks/', UserTasksView.as_view(), name='user-tasks'), 
+    path('users/<int:user_id>/tasks/bulk/', UserTasksBulkView.as_view(), name='user-tasks-bulk'),
     path('users/<int:user_id>/tasks/<int:task_id>/', UserTaskDetailView.as_view(), name='user-task-detail'),
     path('users/<int:user_id>/update-task/<int:task_id>/', UserTaskDetailView.as_view(), name='user-task-update'),
     path('user-routine/', UserRoutineView.as_view(), name='user-routines'),
@@ -16,4 +17,5 @@ urlpatterns = [
     path('routine/mark-completed/', MarkActivityCompletedView.as_view(), name='mark-activity-completed'),
     path('routine/remove-activity/', RemoveActivityFromRoutineView.as_view(), name='remove-activity-from-routine'),
     path('friends/list/', FriendsListView.as_view(), name='friends-list'),
+    path('counters/', CountersView.as_view(), name='counters'),
 ]
\ No newline at end of file
@@ -7,11 +7,17 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 # from .models import Routine, RoutineActivityCompletion, Task, User, UserRoutine  # Import your custom User model
 from .models import Routine, RoutineActivityCompletion, Task, User, UserRoutine, Friendship  # Import your custom User model
-from .serializers import SignupSerializer, LoginSerializer, TaskSerializer
+from .serializers import SignupSerializer, LoginSerializer, TaskSerializer, BulkTaskSerializer
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import StatelessJWTAuthentication
 from rest_framework import serializers
-from django.db import models
+from django.db import connection, models, transaction
+from .pagination import TaskCursorPagination
+from .cache import invalidate_user
+from .counters import get_counters
+from social.services import get_friends
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 # Signup View
 class SignupView(APIView):
@@ -88,30 +94,22 @@ class RefreshTokenView(APIView):
             )
 
 class FriendsListView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         """Get all friends of the authenticated user."""
         try:
-            # Get all accepted friendships where the user is either the user or friend
-            friendships = Friendship.objects.filter(
-                (models.Q(user=request.user) | models.Q(friend=request.user)),
-                status="Accepted"
-            )
-
-            friends_list = []
-            for friendship in friendships:
-                # Determine which user is the friend (not the current user)
-                friend_user = friendship.friend if friendship.user == request.user else friendship.user
-                
-                friends_list.append({
+            friends_list = [
+                {
                     'id': friend_user.id,
                     'username': friend_user.username,
                     'first_name': friend_user.first_name,
                     'last_name': friend_user.last_name,
                     'profile_picture': friend_user.profile_picture.url if friend_user.profile_picture else None
-                })
+                }
+                for friend_user in get_friends(request.user.id)
+            ]
 
             return Response(friends_list, status=status.HTTP_200_OK)
         except Exception as e:
@@ -119,14 +117,49 @@ class FriendsListView(APIView):
 
 # API for user-specific tasks
 class UserTasksView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request, user_id):
-        """Get all tasks of a specific user."""
+        """
+        Get the tasks of a specific user.
+        Optional filters: ?day=Wednesday&priority=High&is_fixed_time=true
+        Passing ?limit= or ?cursor= switches to cursor-paginated responses.
+        """
         try:
             tasks = Task.objects.filter(user_id=user_id)
-            serializer = TaskSerializer(tasks, many=True)
+
+            day = request.query_params.get("day")
+            if day:
+                day = day.capitalize()
+                if day not in DAYS_OF_WEEK:
+                    return Response({"error": f"Invalid day '{day}'."}, status=status.HTTP_400_BAD_REQUEST)
+                if connection.vendor == "postgresql":
+                    # jsonb @> '["Wednesday"]', served by the GIN index on days_associated
+                    tasks = tasks.filter(days_associated__contains=[day])
+                else:
+                    tasks = tasks.filter(days_associated__icontains=f'"{day}"')
+
+            priority = request.query_params.get("priority")
+            if priority:
+                priority = priority.capitalize()
+                if priority not in ("High", "Medium", "Low"):
+                    return Response({"error": f"Invalid priority '{priority}'."}, status=status.HTTP_400_BAD_REQUEST)
+                tasks = tasks.filter(priority=priority)
+
+            is_fixed_time = request.query_params.get("is_fixed_time")
+            if is_fixed_time is not None:
+                if is_fixed_time.lower() not in ("true", "false"):
+                    return Response({"error": "is_fixed_time must be true or false."}, status=status.HTTP_400_BAD_REQUEST)
+                tasks = tasks.filter(is_fixed_time=is_fixed_time.lower() == "true")
+
+            if "limit" in request.query_params or "cursor" in request.query_params:
+                paginator = TaskCursorPagination()
+                page = paginator.paginate_queryset(tasks, request, view=self)
+                serializer = TaskSerializer(page, many=True)
+                return paginator.get_paginated_response(serializer.data)
+
+            serializer = TaskSerializer(tasks.order_by('id'), many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -144,7 +177,7 @@ class UserTasksView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class UserTaskDetailView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def put(self, request, user_id, task_id):
@@ -172,8 +205,103 @@ class UserTaskDetailView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class UserTasksBulkView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
+    permission_classes = [IsAuthenticated]  # Require authentication
+
+    def post(self, request, user_id):
+        """
+        Apply a batch of task operations in one transaction.
+        Body: {"operations": [
+            {"action": "create", "data": {...}},
+            {"action": "update", "id": 12, "data": {...}},
+            {"action": "delete", "id": 13}
+        ]}
+        Nothing is written unless every operation is valid, and each task id
+        may appear in at most one update or delete.
+        """
+        operations = request.data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return Response({"error": "A non-empty list of operations is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            errors = []
+            creates, updates, deletes = [], [], []  # (index, payload) pairs
+            targeted = {}  # task id -> index of the first update/delete naming it
+            for index, operation in enumerate(operations):
+                action = operation.get("action") if isinstance(operation, dict) else None
+                if action == "create":
+                    creates.append((index, operation.get("data") or {}))
+                elif action in ("update", "delete"):
+                    if not isinstance(operation.get("id"), int):
+                        errors.append({"index": index, "action": action, "errors": {"id": ["A task id is required."]}})
+                    elif operation["id"] in targeted:
+                        # e.g. an update then a delete of one task: the outcome would depend on apply order
+                        errors.append({"index": index, "action": action, "errors": {
+                            "id": [f"Task {operation['id']} is already changed by operation {targeted[operation['id']]}."]
+                        }})
+                    else:
+                        targeted[operation["id"]] = index
+                        if action == "update":
+                            updates.append((index, operation))
+                        else:
+                            deletes.append((index, operation["id"]))
+                else:
+                    errors.append({"index": index, "action": action, "errors": {"action": ["Must be create, update or delete."]}})
+
+            # One query for every task the batch touches
+            target_ids = [op["id"] for _, op in updates] + [task_id for _, task_id in deletes]
+            tasks = Task.objects.filter(user_id=user_id).in_bulk(target_ids)
+            for index, task_id in [(i, op["id"]) for i, op in updates] + deletes:
+                if task_id not in tasks:
+                    errors.append({"index": index, "action": operations[index]["action"], "errors": {"id": ["Task not found."]}})
+
+            create_serializer = BulkTaskSerializer(data=[data for _, data in creates], many=True)
+            if not create_serializer.is_valid():
+                for (index, _), item_errors in zip(creates, create_serializer.errors):
+                    if item_errors:
+                        errors.append({"index": index, "action": "create", "errors": item_errors})
+
+            update_serializer = BulkTaskSerializer(data=[op.get("data") or {} for _, op in updates], many=True, partial=True)
+            if not update_serializer.is_valid():
+                for (index, _), item_errors in zip(updates, update_serializer.errors):
+                    if item_errors:
+                        errors.append({"index": index, "action": "update", "errors": item_errors})
+
+            if errors:
+                errors.sort(key=lambda error: error["index"])
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                created = Task.objects.bulk_create([
+                    Task(user_id=user_id, **validated_data)
+                    for validated_data in create_serializer.validated_data
+                ])
+
+                updated, update_fields = [], set()
+                for (_, op), validated_data in zip(updates, update_serializer.validated_data):
+                    task = tasks[op["id"]]
+                    for field, value in validated_data.items():
+                        setattr(task, field, value)
+                    update_fields.update(validated_data)
+                    updated.append(task)
+                if updated and update_fields:
+                    Task.objects.bulk_update(updated, list(update_fields))
+
+                deleted_ids = [task_id for _, task_id in deletes]
+                if deleted_ids:
+                    Task.objects.filter(user_id=user_id, id__in=deleted_ids).delete()
+
+            return Response({
+                "created": TaskSerializer(created, many=True).data,
+                "updated": TaskSerializer(updated, many=True).data,
+                "deleted": deleted_ids
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class UserRoutineView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -233,7 +361,7 @@ class UserRoutineView(APIView):
 #         return Response({"message": "Profile picture uploaded successfully!"}, status=status.HTTP_200_OK)
 
 class UploadUserPfp(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
@@ -245,7 +373,8 @@ class UploadUserPfp(APIView):
             return Response({"error": "No profile picture file provided."}, status=status.HTTP_400_BAD_REQUEST)
 
         user.profile_picture = profile_picture_file
-        user.save()
+        user.save(update_fields=['profile_picture'])  # the rest of request.user may be a cached, stale row
+        invalidate_user(user.id)
 
         profile_picture_url = None
         if user.profile_picture:
@@ -257,7 +386,7 @@ class UploadUserPfp(APIView):
         }, status=status.HTTP_200_OK)
 
 class MarkActivityCompletedView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -294,7 +423,7 @@ class MarkActivityCompletedView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class RemoveActivityFromRoutineView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -364,4 +493,15 @@ class RemoveActivityFromRoutineView(APIView):
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class CountersView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Badge counts (pending friend requests, unread messages per friend, unread notifications)."""
+        try:
+            return Response(get_counters(request.user.id), status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
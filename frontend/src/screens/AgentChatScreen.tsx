@@ -58,17 +58,28 @@ const AgentChatScreen = () => {
     setInputMessage('');
     setIsLoading(true);
 
-    try {
-      const response = await chatApi.sendMessage(inputMessage);
-      if (response && response.response) {
-        const agentMessage: Message = {
-          id: Date.now() + 1,
-          content: response.response,
+    // The agent bubble appears with the first token and grows as the rest stream in
+    const agentMessageId = Date.now() + 1;
+    let started = false;
+    const appendToken = (text: string) => {
+      if (!started) {
+        started = true;
+        setIsLoading(false);
+        setMessages(prev => [...prev, {
+          id: agentMessageId,
+          content: text,
           is_user: false,
           created_at: new Date().toISOString(),
-        };
-        setMessages(prev => [...prev, agentMessage]);
+        }]);
+        return;
       }
+      setMessages(prev => prev.map(m =>
+        m.id === agentMessageId ? { ...m, content: m.content + text } : m
+      ));
+    };
+
+    try {
+      await chatApi.streamMessage(userMessage.content, appendToken);
     } catch (error) {
       console.error('Error sending message:', error);
       Alert.alert('Error', 'Failed to send message');
@@ -80,10 +80,15 @@ const ChatScreen = () => {
   const [currentUsername, setCurrentUsername] = useState<string | null>(null)
   const [friendDetails, setFriendDetails] = useState<User | null>(null)
   const [loading, setLoading] = useState(true)
+  const [loadingOlder, setLoadingOlder] = useState(false)
+  const [nextBefore, setNextBefore] = useState<string | null>(null)
+  const [hasMore, setHasMore] = useState(false)
   const [sending, setSending] = useState(false)
   const [isTyping, setIsTyping] = useState(false)
   const [isOnline, setIsOnline] = useState(true)
   const flatListRef = useRef<FlatList>(null)
+  // Set while older messages are prepended so the list keeps its position instead of jumping to the end
+  const prependingRef = useRef(false)
   const inputHeight = useRef(new Animated.Value(42)).current
 
   useEffect(() => {
@@ -132,7 +137,17 @@ const ChatScreen = () => {
     return () => clearInterval(typingInterval)
   }, [friendId, friendName, friendAvatar])
 
+  const sortByTimestamp = (msgs: Message[]) =>
+    msgs.sort(
+      (a: Message, b: Message) =>
+        new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime()
+    )
+
   const scrollToBottom = () => {
+    if (prependingRef.current) {
+      prependingRef.current = false
+      return
+    }
     if (messages.length > 0) {
       flatListRef.current?.scrollToEnd({ animated: true })
     }
@@ -144,13 +159,10 @@ const ChatScreen = () => {
 
       setLoading(true)
       try {
-        const msgs = await fetchMessages(friendId)
-        const sortedMsgs = msgs.sort(
-          (a: Message, b: Message) =>
-            new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime()
-        )
-
-        setMessages(sortedMsgs)
+        const page = await fetchMessages(friendId)
+        setMessages(sortByTimestamp(page.messages))
+        setNextBefore(page.nextBefore)
+        setHasMore(page.hasMore)
         await markMessagesAsRead(friendId)
         setTimeout(scrollToBottom, 300)
       } catch (err) {
@@ -163,6 +175,26 @@ const ChatScreen = () => {
     if (currentUsername) initChat()
   }, [friendId, currentUsername])
 
+  const loadOlderMessages = async () => {
+    if (!hasMore || !nextBefore || loadingOlder || loading) return
+
+    setLoadingOlder(true)
+    try {
+      const page = await fetchMessages(friendId, nextBefore)
+      prependingRef.current = page.messages.length > 0
+      setMessages((prev) => {
+        const seen = new Set(prev.map((message) => message.id))
+        return [...sortByTimestamp(page.messages.filter((message: Message) => !seen.has(message.id))), ...prev]
+      })
+      setNextBefore(page.nextBefore)
+      setHasMore(page.hasMore)
+    } catch (err) {
+      // fetchMessages already alerted; leave the cursor so scrolling up retries
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
   const handleSendMessage = async () => {
     if (!newMessage.trim() || sending || !currentUsername) return
 
@@ -380,6 +412,14 @@ const ChatScreen = () => {
             contentContainerStyle={styles.chatListContainer}
             onContentSizeChange={scrollToBottom}
             onLayout={scrollToBottom}
+            onStartReached={loadOlderMessages}
+            onStartReachedThreshold={0.2}
+            maintainVisibleContentPosition={{ minIndexForVisible: 0 }}
+            ListHeaderComponent={
+              loadingOlder ? (
+                <ActivityIndicator size="small" color={COLORS.primary} style={styles.olderLoader} />
+              ) : null
+            }
             showsVerticalScrollIndicator={false}
             initialNumToRender={15}
             maxToRenderPerBatch={10}
@@ -636,6 +676,9 @@ const styles = StyleSheet.create({
   sendButtonDisabled: {
     backgroundColor: COLORS.inactive,
   },
+  olderLoader: {
+    marginVertical: 10,
+  },
   loadingContainer: {
     flex: 1,
     justifyContent: "center",
@@ -403,13 +403,25 @@ export const fetchFriendRequests = async (): Promise<FriendRequest[]> => {
   }
 };
 
-// Get all messages between the authenticated user and a friend
-export const fetchMessages = async (friendId: number) => {
+// Get a page of messages between the authenticated user and a friend
+// (newest page by default; pass the returned `nextBefore` cursor to load older messages)
+export const fetchMessages = async (friendId: number, before?: string) => {
   try {
+    const query = before ? `?before=${encodeURIComponent(before)}` : "";
     const response = await makeAuthenticatedRequest(
-      `/api/messages/${friendId}/`
+      `/api/messages/${friendId}/${query}`
     );
-    return await response.json();
+    const page = await response.json();
+    // Participants are side-loaded once per page; expand them back onto each message
+    return {
+      messages: page.messages.map((message: any) => ({
+        ...message,
+        sender: page.users[message.sender],
+        receiver: page.users[message.receiver],
+      })),
+      nextBefore: page.next_before as string | null,
+      hasMore: page.has_more as boolean,
+    };
   } catch (error: any) {
     console.error("Error fetching messages:", error);
     Alert.alert("Error", error.message || "Failed to fetch messages.");
@@ -572,6 +584,50 @@ export const chatApi = {
     }
   },
 
+  // Streams the reply over server-sent events; onToken gets each chunk as it arrives.
+  // XMLHttpRequest because React Native's fetch does not expose a readable body.
+  streamMessage: async (
+    message: string,
+    onToken: (text: string) => void
+  ): Promise<ChatResponse> => {
+    const accessToken = await refreshToken();
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      let parsed = 0;
+      let result: ChatResponse | null = null;
+
+      const readEvents = () => {
+        const events = xhr.responseText.slice(parsed).split("\n\n");
+        const complete = events.slice(0, -1); // the last piece may still be arriving
+        complete.forEach((raw) => {
+          parsed += raw.length + 2;
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = raw.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) return;
+          const payload = JSON.parse(data);
+          if (event === "token") onToken(payload.text);
+          else if (event === "done") result = payload;
+          else if (event === "error") reject(new Error(payload.error));
+        });
+      };
+
+      xhr.open("POST", `${API_BASE_URL}/api/agent/chat/stream/`);
+      xhr.setRequestHeader("Content-Type", "application/json");
+      xhr.setRequestHeader("Authorization", `Bearer ${accessToken}`);
+      xhr.onprogress = readEvents;
+      xhr.onload = () => {
+        if (xhr.status !== 200) {
+          reject(new Error(`HTTP error! Status: ${xhr.status}`));
+          return;
+        }
+        readEvents();
+        result ? resolve(result) : reject(new Error("Stream ended early"));
+      };
+      xhr.onerror = () => reject(new Error("Network error"));
+      xhr.send(JSON.stringify({ message }));
+    });
+  },
+
   getMessages: async (): Promise<{ messages: Message[] }> => {
     try {
       const response = await makeAuthenticatedRequest("/api/agent/chat/");
@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from core.models import Hobby, UserHobby
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.authentication import StatelessJWTAuthentication
 
 # Serializer for the Hobby model
 from rest_framework import serializers
@@ -17,7 +17,7 @@ class HobbySerializer(serializers.ModelSerializer):
 # General Hobbies API for All Users (Explore Hobbies)
 class ExploreHobbiesView(APIView):
 
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request):
@@ -32,7 +32,7 @@ class ExploreHobbiesView(APIView):
 # User-specific Hobby APIs
 class UserHobbiesView(APIView):
 
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request, user_id):
@@ -11,7 +11,9 @@ from core.models import Routine, RoutineActivityCompletion, Task, UserHobby, Hob
 from django.contrib.auth import get_user_model
 import re  # ✅ Import the regular expression module
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.http import JsonResponse
+from core.authentication import StatelessJWTAuthentication
+from core.async_views import AsyncAPIView
 
 User = get_user_model()
 
@@ -53,16 +55,16 @@ def parse_routine_text(routine_text):
 
     return routine_data
 
-class GenerateRoutineView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
-    permission_classes = [IsAuthenticated]  # Require authentication
+class GenerateRoutineView(AsyncAPIView):
+    # Async (JWT-authenticated, see AsyncAPIView) so the multi-second Gemini call
+    # does not hold a worker thread
 
-    def post(self, request, user_id, *args, **kwargs):  # ✅ Take user_id as path parameter
+    async def post(self, request, user_id, *args, **kwargs):  # ✅ Take user_id as path parameter
 
         try:
-            user = User.objects.get(pk=user_id)  # ✅ Fetch user based on user_id from URL
+            user = await User.objects.aget(pk=user_id)  # ✅ Fetch user based on user_id from URL
         except User.DoesNotExist:
-            return Response({"error": f"User with ID {user_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+            return JsonResponse({"error": f"User with ID {user_id} not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Fetch User Data Dynamically - Modified timedelta formatting
         user_tasks_queryset = Task.objects.filter(user=user).values(
@@ -70,7 +72,7 @@ class GenerateRoutineView(APIView):
             'is_fixed_time', 'fixed_time_slot', 'priority'
         )
         user_tasks = []
-        for task_dict in user_tasks_queryset:
+        async for task_dict in user_tasks_queryset:
             task_data = dict(task_dict)  # Convert ValuesQuerySet dictionary to regular dictionary
             time_required_timedelta = task_data.get('time_required')
             if time_required_timedelta:
@@ -82,7 +84,7 @@ class GenerateRoutineView(APIView):
             user_tasks.append(task_data)
 
         user_hobbies_queryset = UserHobby.objects.filter(user=user).select_related('hobby')
-        user_hobbies = [{"name": user_hobby.hobby.name, "category": user_hobby.hobby.category} for user_hobby in
+        user_hobbies = [{"name": user_hobby.hobby.name, "category": user_hobby.hobby.category} async for user_hobby in
                          user_hobbies_queryset]
 
         # user_settings_queryset = UserSetting.objects.filter(user=user).values('day_start_time', 'day_end_time', 'off_day_toggle').first()
@@ -146,7 +148,7 @@ class GenerateRoutineView(APIView):
 
         # Call Gemini API using the SDK
         try:
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(prompt)
             if response.text:
                 raw_response_text = response.text  # Capture raw response text
 
@@ -154,7 +156,7 @@ class GenerateRoutineView(APIView):
                 try:
                     generated_routine = parse_routine_text(raw_response_text)  # Call manual parsing function
                 except Exception as e:  # Catch any parsing errors
-                    return Response(
+                    return JsonResponse(
                         {"error": "Failed to parse routine text manually", "raw_response": raw_response_text,
                          "details": str(e)},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # Send raw_response for debugging
@@ -164,59 +166,59 @@ class GenerateRoutineView(APIView):
                     end_date = today + timedelta(days=7)  # Routine for the next 7 days
 
                     # Delete only the existing primary routine (if any)
-                    existing_primary = UserRoutine.objects.filter(user=user, is_primary=True).first()
+                    existing_primary = await UserRoutine.objects.filter(user=user, is_primary=True).select_related('routine').afirst()
                     if existing_primary:
-                        existing_primary.routine.delete()  # Deletes the linked Routine
-                        existing_primary.delete()         # Deletes only this UserRoutine
+                        await existing_primary.routine.adelete()  # Deletes the linked Routine
+                        await existing_primary.adelete()         # Deletes only this UserRoutine
 
                     # Now create a new routine
-                    routine = Routine.objects.create(
+                    routine = await Routine.objects.acreate(
                         start_date=today,
                         end_date=end_date,
                         routine_data=generated_routine
                     )
 
-                    UserRoutine.objects.create(
+                    await UserRoutine.objects.acreate(
                         user=user,
                         routine=routine,
                         permission='Edit',
                         is_primary=True  # ✅ Set the new one as primary
                     )
-                    return Response({"routine": generated_routine}, status=status.HTTP_201_CREATED)
+                    return JsonResponse({"routine": generated_routine}, status=status.HTTP_201_CREATED)
                 except Exception as db_error:  # Catch database errors
-                    return Response(
+                    return JsonResponse(
                         {"error": "Failed to save routine to database", "details": str(db_error)},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR) # ✅ Handle database save errors
                 
             else:
-                return Response({"error": "The model returned no text"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                return JsonResponse({"error": "The model returned no text"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         except exceptions.GoogleAPIError as e:
-            return Response({"error": f"Gemini API Error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse({"error": f"Gemini API Error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def put(self, request, user_id, *args, **kwargs):
+    async def put(self, request, user_id, *args, **kwargs):
         try:
-            user = User.objects.get(pk=user_id)
+            user = await User.objects.aget(pk=user_id)
         except User.DoesNotExist:
-            return Response({"error": f"User with ID {user_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+            return JsonResponse({"error": f"User with ID {user_id} not found"}, status=status.HTTP_404_NOT_FOUND)
 
         today = date.today()
         today_str = today.strftime("%A")
 
         try:
-            current_routine = Routine.objects.get(
+            current_routine = await Routine.objects.aget(
                 user_routines__user=user,
                 start_date__lte=today,
                 end_date__gte=today,
                 user_routines__is_primary=True
             )
         except Routine.DoesNotExist:
-            return Response({"error": "No active primary routine found."}, status=status.HTTP_404_NOT_FOUND)
+            return JsonResponse({"error": "No active primary routine found."}, status=status.HTTP_404_NOT_FOUND)
 
         user_hobbies_queryset = UserHobby.objects.filter(user=user).select_related('hobby')
-        user_hobbies = [{"name": user_hobby.hobby.name, "category": user_hobby.hobby.category} for user_hobby in user_hobbies_queryset]
+        user_hobbies = [{"name": user_hobby.hobby.name, "category": user_hobby.hobby.category} async for user_hobby in user_hobbies_queryset]
         user_settings = {
             "day_start_time": "07:00:00",
             "day_end_time": "21:00:00",
@@ -246,7 +248,7 @@ class GenerateRoutineView(APIView):
         """
 
         try:
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(prompt)
             if response.text:
                 try:
                     off_day_routine = parse_routine_text(response.text)
@@ -271,26 +273,26 @@ class GenerateRoutineView(APIView):
                         
                         # Update routine with normalized activities
                         current_routine.routine_data[today_str] = normalized_activities
-                        current_routine.save()
-                        return Response({"routine_data": current_routine.routine_data}, status=status.HTTP_200_OK)
+                        await current_routine.asave()
+                        return JsonResponse({"routine_data": current_routine.routine_data}, status=status.HTTP_200_OK)
                     else:
-                        return Response({"error": f"The model did not return a routine for {today_str} or returned an empty routine. Raw response:\n{response.text}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                        return JsonResponse({"error": f"The model did not return a routine for {today_str} or returned an empty routine. Raw response:\n{response.text}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
                 except Exception as parsing_error:
-                    return Response(
+                    return JsonResponse(
                         {"error": "Failed to parse routine text.", "details": str(parsing_error), "raw_response": response.text},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR
                     )
             else:
-                return Response({"error": "The model returned no text"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                return JsonResponse({"error": "The model returned no text"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         except exceptions.GoogleAPIError as api_error:
-            return Response({"error": f"Gemini API Error: {str(api_error)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse({"error": f"Gemini API Error: {str(api_error)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as general_error:
-            return Response({"error": str(general_error)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse({"error": str(general_error)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class EnhancedRoutineAnalyticsView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import User
+from social.services import get_friend_versions, load_friend_id_sets, store_friend_id_sets
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the cached friendship graph (every user's accepted-friend id set). "
+        "Run periodically, e.g. from cron, so suggestion and friendship lookups stay warm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users loaded per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            versions = get_friend_versions(batch)  # before the load, so a concurrent write wins
+            store_friend_id_sets(load_friend_id_sets(batch), versions)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt friend sets for {len(user_ids)} users."))
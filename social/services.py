@@ -0,0 +1,207 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+from django.utils import timezone
+
+from core.models import Friendship, User, UserHobby
+
+FRIENDS_CACHE_TTL = 10 * 60  # safety net; writes bump the user's version
+SUGGESTION_CANDIDATES = 200  # best candidates per signal that get scored
+NEW_USER_WINDOW = timedelta(days=30)
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+SEARCH_PROJECTION = ('id', 'username', 'first_name', 'last_name', 'profile_picture')
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default for the % operator
+
+
+def _friends_key(user_id, version):
+    return f"friends:{user_id}:{version}"
+
+
+def _friends_version_key(user_id):
+    return f"friends_version:{user_id}"
+
+
+def get_friend_versions(user_ids):
+    """
+    Current friend-set version per user. Read these before loading from the
+    database: a set stored under a version that a write has since bumped is
+    never read again, so a reader racing a write cannot cache a stale set.
+    """
+    keys = {_friends_version_key(user_id): user_id for user_id in user_ids}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # A clock value never reuses a version an evicted key may have had
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def load_friend_id_sets(user_ids):
+    """Build {user_id: set of accepted friend ids} from the database in one query."""
+    friend_sets = {user_id: set() for user_id in user_ids}
+    edges = Friendship.objects.filter(
+        Q(user_low_id__in=user_ids) | Q(user_high_id__in=user_ids),
+        status="Accepted"
+    ).values_list('user_low_id', 'user_high_id')
+    for low, high in edges:
+        if low in friend_sets:
+            friend_sets[low].add(high)
+        if high in friend_sets:
+            friend_sets[high].add(low)
+    return friend_sets
+
+
+def store_friend_id_sets(friend_sets, versions):
+    """Cache friend sets loaded after reading `versions` (get_friend_versions)."""
+    cache.set_many(
+        {_friends_key(user_id, versions[user_id]): ids for user_id, ids in friend_sets.items()}, FRIENDS_CACHE_TTL
+    )
+
+
+def get_friend_id_sets(user_ids):
+    """Return {user_id: friend id set} for many users with two cache round trips plus one query for misses."""
+    versions = get_friend_versions(user_ids)
+    keys = {_friends_key(user_id, version): user_id for user_id, version in versions.items()}
+    friend_sets = {keys[key]: ids for key, ids in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in friend_sets]
+    if missing:
+        loaded = load_friend_id_sets(missing)
+        store_friend_id_sets(loaded, versions)
+        friend_sets.update(loaded)
+    return friend_sets
+
+
+def get_friend_ids(user_id):
+    """Return the set of ids of the user's accepted friends, cached per user."""
+    user_id = int(user_id)
+    return get_friend_id_sets([user_id])[user_id]
+
+
+def are_friends(user_id, other_id):
+    """O(1) membership check against the cached friend set."""
+    return int(other_id) in get_friend_ids(user_id)
+
+
+def get_friends(user_id):
+    """Resolve the user's friends with a single in_bulk query."""
+    return list(User.objects.in_bulk(get_friend_ids(user_id)).values())
+
+
+def invalidate_friends(*user_ids):
+    """
+    Retire cached friend sets after an accepted friendship is created or removed.
+    The version is bumped now and again once the transaction commits, so a set
+    loaded from the pre-commit state in between is never served.
+    """
+    _bump_friend_versions(user_ids)
+    transaction.on_commit(lambda: _bump_friend_versions(user_ids))
+
+
+def _bump_friend_versions(user_ids):
+    for user_id in user_ids:
+        key = _friends_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def suggest_friends(user_id, limit=20):
+    """
+    Rank people the user may know by mutual friends, shared hobbies and how
+    recently they joined. Mutual counts come from the cached friend sets, so
+    the cost depends on the user's neighbourhood, not on the user count.
+    """
+    friend_ids = get_friend_ids(user_id)
+
+    # Skip the user, the admin, friends and anyone with a request in flight
+    excluded = {user_id, 1} | friend_ids
+    for edge in Friendship.objects.involving(user_id).values_list('user_low_id', 'user_high_id'):
+        excluded.update(edge)
+
+    mutual = Counter()
+    for friends_of_friend in get_friend_id_sets(list(friend_ids)).values():
+        mutual.update(friends_of_friend - excluded)
+    candidates = {candidate for candidate, _ in mutual.most_common(SUGGESTION_CANDIDATES)}
+
+    shared_hobbies = Counter()
+    hobby_ids = list(UserHobby.objects.filter(user_id=user_id).values_list('hobby_id', flat=True))
+    if hobby_ids:
+        sharers = UserHobby.objects.filter(hobby_id__in=hobby_ids).exclude(user_id__in=excluded)
+        top_sharers = sharers.values('user_id').annotate(shared=Count('hobby_id', distinct=True)).order_by('-shared')
+        for row in top_sharers[:SUGGESTION_CANDIDATES]:
+            shared_hobbies[row['user_id']] = row['shared']
+        # Hobby overlap for friends-of-friends that did not make the top sharers
+        unscored = candidates - set(shared_hobbies)
+        if unscored:
+            for row in sharers.filter(user_id__in=unscored).values('user_id').annotate(shared=Count('hobby_id', distinct=True)):
+                shared_hobbies[row['user_id']] = row['shared']
+        candidates |= set(shared_hobbies)
+
+    users = User.objects.only(
+        'id', 'username', 'first_name', 'last_name', 'profile_picture', 'created_at'
+    ).in_bulk(candidates)
+    new_since = timezone.now() - NEW_USER_WINDOW
+
+    def score(user):
+        return 3 * mutual[user.id] + 2 * shared_hobbies[user.id] + (1 if user.created_at >= new_since else 0)
+
+    ranked = sorted(users.values(), key=lambda user: (score(user), user.id), reverse=True)[:limit]
+    return [
+        {
+            "id": user.id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "profile_picture": user.profile_picture.url if user.profile_picture else None,
+            "mutual_friends": mutual[user.id],
+            "shared_hobbies": shared_hobbies[user.id],
+        }
+        for user in ranked
+    ]
+
+
+def search_users(user_id, query):
+    """
+    Rank users whose username or name contains, starts with or resembles the
+    query. Returns lightweight dicts (SEARCH_PROJECTION plus rank), best first.
+    On PostgreSQL this is served by the trigram indexes on User; other
+    databases get an equivalent pure-Python ranking.
+    """
+    if connection.vendor != 'postgresql':
+        return _search_users_python(user_id, query)
+
+    needle = query.upper()
+    users = User.objects.exclude(id__in=[user_id, 1]).alias(
+        **{f'upper_{field}': Upper(field) for field in SEARCH_FIELDS}
+    )
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'upper_{field}__contains': needle}) | Q(**{f'upper_{field}__trigram_similar': needle})
+    return users.filter(matches).annotate(
+        rank=Greatest(*[TrigramSimilarity(F(f'upper_{field}'), needle) for field in SEARCH_FIELDS])
+        + Case(When(upper_username__startswith=needle, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    ).order_by('-rank', 'id').values(*SEARCH_PROJECTION, 'rank')
+
+
+def _search_users_python(user_id, query):
+    needle = query.lower()
+    results = []
+    for user in User.objects.exclude(id__in=[user_id, 1]).values(*SEARCH_PROJECTION):
+        values = [(user[field] or '').lower() for field in SEARCH_FIELDS]
+        similarity = max(SequenceMatcher(None, needle, value).ratio() for value in values)
+        if similarity < SIMILARITY_THRESHOLD and not any(needle in value for value in values):
+            continue
+        user['rank'] = similarity + (1.0 if values[0].startswith(needle) else 0.0)
+        results.append(user)
+    results.sort(key=lambda user: (-user['rank'], user['id']))
+    return results
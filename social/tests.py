@@ -1,3 +1,199 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from core.counters import get_counters
+from core.models import Friendship, User
+
+from .services import (
+    are_friends, get_friend_ids, get_friend_versions, invalidate_friends, load_friend_id_sets, store_friend_id_sets,
+)
+
+
+class SocialTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create(username="alice", email="alice@example.com")
+        self.bob = User.objects.create(username="bob", email="bob@example.com")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.alice)}")
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def befriend(self, user, other):
+        low, high = sorted((user.id, other.id))
+        Friendship.objects.create(user_low_id=low, user_high_id=high, requester=user, status="Accepted")
+        invalidate_friends(user.id, other.id)
+
+
+class FriendCacheTests(SocialTestCase):
+    def test_cached_set_follows_writes(self):
+        self.assertFalse(are_friends(self.alice.id, self.bob.id))
+        self.befriend(self.alice, self.bob)
+        self.assertTrue(are_friends(self.alice.id, self.bob.id))
+
+        Friendship.objects.between(self.alice.id, self.bob.id).delete()
+        invalidate_friends(self.alice.id, self.bob.id)
+        self.assertEqual(get_friend_ids(self.alice.id), set())
+
+    def test_reader_racing_a_removal_cannot_cache_a_stale_set(self):
+        self.befriend(self.alice, self.bob)
+
+        # A reader reads the version and loads the set just before the removal...
+        versions = get_friend_versions([self.alice.id])
+        stale = load_friend_id_sets([self.alice.id])
+        Friendship.objects.between(self.alice.id, self.bob.id).delete()
+        invalidate_friends(self.alice.id, self.bob.id)
+        # ...and stores it after the invalidation
+        store_friend_id_sets(stale, versions)
+
+        self.assertFalse(are_friends(self.alice.id, self.bob.id))
+
+    def test_lost_version_is_never_reused(self):
+        self.befriend(self.alice, self.bob)
+        get_friend_ids(self.alice.id)
+        before = get_friend_versions([self.alice.id])[self.alice.id]
+        cache.delete(f"friends_version:{self.alice.id}")
+        self.assertNotEqual(get_friend_versions([self.alice.id])[self.alice.id], before)
+
+
+class FriendSuggestionTests(SocialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.carol = User.objects.create(username="carol", email="carol@example.com")
+        self.dave = User.objects.create(username="dave", email="dave@example.com")
+        self.befriend(self.alice, self.bob)
+        self.befriend(self.bob, self.carol)
+        self.befriend(self.bob, self.dave)
+
+    def suggestions(self, query=""):
+        return self.client.get(f"/api/friends/suggestions/{query}")
+
+    def test_friends_of_friends_are_suggested(self):
+        response = self.suggestions()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({user['id'] for user in response.data}, {self.carol.id, self.dave.id})
+        self.assertEqual({user['mutual_friends'] for user in response.data}, {1})
+
+    def test_limit_is_clamped(self):
+        for query, expected in (("?limit=0", 1), ("?limit=-5", 1), ("?limit=1", 1), ("?limit=500", 2)):
+            with self.subTest(query=query):
+                response = self.suggestions(query)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), expected)
+
+    def test_non_integer_limit(self):
+        self.assertEqual(self.suggestions("?limit=ten").status_code, 400)
+
+
+class FriendRequestFlowTests(SocialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bob_client = self.client_for(self.bob)
+
+    def request_friendship(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/friends/send/{self.bob.id}/")
+
+    def test_request_accept_remove(self):
+        response = self.request_friendship()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["user"], response.data["friend"]), (self.alice.id, self.bob.id))
+        self.assertEqual(get_counters(self.bob.id)["pending_friend_requests"], 1)
+
+        [pending] = self.bob_client.get("/api/friends/requests/").data
+        self.assertEqual(pending["sender_username"], "alice")
+        self.assertEqual(self.client.get("/api/friends/requests/").data, [])  # not the sender's to answer
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bob_client.post(f"/api/friends/respond/{pending['id']}/", {"action": "Accept"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_counters(self.bob.id)["pending_friend_requests"], 0)
+        self.assertEqual([friend["id"] for friend in self.client.get("/api/friends/list/").data], [self.bob.id])
+        self.assertEqual([friend["id"] for friend in self.bob_client.get("/api/friends/list/").data], [self.alice.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.bob_client.delete(f"/api/friends/remove/{self.alice.id}/").status_code, 200)
+        self.assertEqual(self.client.get("/api/friends/list/").data, [])
+        self.assertFalse(Friendship.objects.exists())
+
+    def test_one_edge_per_pair(self):
+        self.request_friendship()
+        self.assertEqual(self.client.post(f"/api/friends/send/{self.bob.id}/").status_code, 400)
+        self.assertEqual(self.bob_client.post(f"/api/friends/send/{self.alice.id}/").status_code, 400)
+        edge = Friendship.objects.get()
+        self.assertEqual((edge.user_low_id, edge.user_high_id), tuple(sorted((self.alice.id, self.bob.id))))
+
+    def test_sender_cannot_accept_own_request(self):
+        self.request_friendship()
+        edge = Friendship.objects.get()
+        response = self.client.post(f"/api/friends/respond/{edge.id}/", {"action": "Accept"}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_reject_deletes_the_request(self):
+        self.request_friendship()
+        edge = Friendship.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob_client.post(f"/api/friends/respond/{edge.id}/", {"action": "Reject"}, format="json")
+        self.assertFalse(Friendship.objects.exists())
+        self.assertEqual(get_counters(self.bob.id)["pending_friend_requests"], 0)
+
+    def test_reject_cannot_remove_an_accepted_friendship(self):
+        self.request_friendship()
+        edge = Friendship.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob_client.post(f"/api/friends/respond/{edge.id}/", {"action": "Accept"}, format="json")
+        self.assertTrue(are_friends(self.alice.id, self.bob.id))  # cached now
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bob_client.post(f"/api/friends/respond/{edge.id}/", {"action": "Reject"}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Friendship.objects.filter(status="Accepted").exists())
+        self.assertTrue(are_friends(self.alice.id, self.bob.id))
+        self.assertEqual(get_counters(self.bob.id)["pending_friend_requests"], 0)
+
+    def test_reject_retires_cached_friend_sets(self):
+        self.request_friendship()
+        before = get_friend_versions([self.alice.id, self.bob.id])
+        edge = Friendship.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob_client.post(f"/api/friends/respond/{edge.id}/", {"action": "Reject"}, format="json")
+        after = get_friend_versions([self.alice.id, self.bob.id])
+        self.assertTrue(all(after[user_id] != before[user_id] for user_id in before))
+
+
+class UserSearchTests(SocialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.oscar = User.objects.create(username="oscar", email="oscar@example.com")
+        self.carla = User.objects.create(username="carla", email="carla@example.com")
+        self.zed = User.objects.create(username="zed", email="zed@example.com", first_name="Carmen")
+
+    def search(self, query):
+        return self.client.get(f"/api/users/search/{query}")
+
+    def test_username_prefix_ranks_first(self):
+        response = self.search("?q=CAR")
+        self.assertEqual(response.status_code, 200)
+        usernames = [user['username'] for user in response.data['results']]
+        self.assertEqual(usernames[0], "carla")  # case-insensitive username prefix
+        self.assertEqual(set(usernames), {"carla", "oscar", "zed"})  # substring of a username or a name
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username', 'first_name', 'last_name', 'profile_picture', 'rank'})
+
+    def test_searcher_is_excluded(self):
+        results = self.search("?q=alice").data['results']
+        self.assertNotIn(self.alice.id, [user['id'] for user in results])
+
+    def test_pages(self):
+        response = self.search("?q=car&limit=1&offset=1")
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotEqual(response.data['results'][0]['username'], "carla")
+        self.assertIsNotNone(response.data['next'])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.search("?q=%20").status_code, 400)
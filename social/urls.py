@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import FriendRoutineView, UsersView, SendFriendRequestView, RespondToFriendRequestView, ListFriendsView, RemoveFriendView, ViewFriendshipDetailsView, ViewFriendRequestsView, UserDetailAPIView, PublicUserDetailAPIView
+from .views import FriendRoutineView, FriendSuggestionsView, UserSearchView, UsersView, SendFriendRequestView, RespondToFriendRequestView, ListFriendsView, RemoveFriendView, ViewFriendshipDetailsView, ViewFriendRequestsView, UserDetailAPIView, PublicUserDetailAPIView
 
 urlpatterns = [
     path('users/', UsersView.as_view(), name='get_all_users'),
+    path('users/search/', UserSearchView.as_view(), name='user-search'),
     path('users/details/', UserDetailAPIView.as_view(), name='user-detail'),
     path('users/<str:username>/', PublicUserDetailAPIView.as_view(), name='public-user-detail'),
     path("friends/send/<int:to_user_id>/", SendFriendRequestView.as_view(), name="send-friend-request"),
@@ -11,5 +12,6 @@ urlpatterns = [
     path('friends/remove/<int:friend_id>/', RemoveFriendView.as_view(), name='remove-friend'),
     path("friends/details/", ViewFriendshipDetailsView.as_view(), name="friendship-details"),
     path('friends/requests/', ViewFriendRequestsView.as_view(), name='view_friend_requests'),
+    path('friends/suggestions/', FriendSuggestionsView.as_view(), name='friend-suggestions'),
     path('friends/<int:friend_id>/routine/', FriendRoutineView.as_view(), name='friend-routine'),
 ]
\ No newline at end of file
@@ -3,12 +3,15 @@ from rest_framework.response import Response
 from rest_framework import status
 from core.models import RoutineActivityCompletion, User, Friendship, UserRoutine
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.authentication import StatelessJWTAuthentication
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import IntegrityError, transaction
 
 # Serializer for the User model
 from core.serializers import UserSerializer, FriendshipSerializer
+from core.counters import adjust_pending_requests
+from core.pagination import UserSearchPagination
+from .services import are_friends, get_friends, invalidate_friends, search_users, suggest_friends
 
 class PublicUserDetailAPIView(APIView):
     """
@@ -23,7 +26,7 @@ class PublicUserDetailAPIView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class UserDetailAPIView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
@@ -35,7 +38,7 @@ class UserDetailAPIView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class UsersView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request):
@@ -47,9 +50,45 @@ class UsersView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        
+
+class UserSearchView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Search users by username, first name or last name: ?q=ali&limit=20&offset=0"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "A search query (q) is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            paginator = UserSearchPagination()
+            page = paginator.paginate_queryset(search_users(request.user.id, query), request, view=self)
+            storage = User._meta.get_field('profile_picture').storage
+            for user in page:
+                user['profile_picture'] = storage.url(user['profile_picture']) if user['profile_picture'] else None
+            return paginator.get_paginated_response(page)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class FriendSuggestionsView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Suggest people to add, ranked by mutual friends, shared hobbies and recency."""
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 20)), 50))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return Response(suggest_friends(request.user.id, limit=limit), status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class SendFriendRequestView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def post(self, request, to_user_id):
@@ -62,102 +101,112 @@ class SendFriendRequestView(APIView):
             return Response({"error": "You cannot send a friend request to yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check if a request already exists in either direction
-        if Friendship.objects.filter(user=from_user, friend=to_user).exists():
+        existing = Friendship.objects.between(from_user.id, to_user.id).values_list('requester_id', flat=True).first()
+        if existing == from_user.id:
             return Response({"error": "Friend request already sent."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if Friendship.objects.filter(user=to_user, friend=from_user).exists():
+        if existing is not None:
             return Response({"error": "You have already received a friend request from this user."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Create the friend request
-        friendship = Friendship.objects.create(user=from_user, friend=to_user, status="Pending")
+        friendship = Friendship.request(from_user, to_user)
+        try:
+            with transaction.atomic():
+                friendship.save()
+                adjust_pending_requests(to_user.id, 1)
+        except IntegrityError:
+            # The other user sent a request at the same moment
+            return Response({"error": "You have already received a friend request from this user."}, status=status.HTTP_400_BAD_REQUEST)
         serializer = FriendshipSerializer(friendship)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class RespondToFriendRequestView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def post(self, request, request_id):
         """Accept or reject a friend request"""
-        friendship = get_object_or_404(Friendship, id=request_id, friend=request.user)
+        # Only requests still awaiting this user's answer; an accepted friendship is removed via RemoveFriendView
+        pending = Friendship.objects.involving(request.user.id).exclude(requester_id=request.user.id).filter(status="Pending")
+        friendship = get_object_or_404(pending, id=request_id)
         action = request.data.get("action")
 
         if action == "Accept":
-            friendship.status = "Accepted"
-            friendship.save()
+            with transaction.atomic():
+                # Conditional on the request still pending, so concurrent answers are counted once
+                if pending.filter(id=friendship.id).update(status="Accepted"):
+                    adjust_pending_requests(request.user.id, -1)
+            invalidate_friends(friendship.user_low_id, friendship.user_high_id)
             return Response({"message": "Friend request accepted."}, status=status.HTTP_200_OK)
         elif action == "Reject":
             # Delete the Friendship object if the request is rejected
-            friendship.delete()
+            with transaction.atomic():
+                deleted, _ = pending.filter(id=friendship.id).delete()
+                if deleted:
+                    adjust_pending_requests(request.user.id, -1)
+            invalidate_friends(friendship.user_low_id, friendship.user_high_id)
             return Response({"message": "Friend request rejected."}, status=status.HTTP_200_OK)
         else:
             return Response({"error": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class ListFriendsView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request):
         """List all friends of the authenticated user"""
-        friends = Friendship.objects.filter(
-            (models.Q(user=request.user) | models.Q(friend=request.user)),
-            status="Accepted"
-        )
-
         friend_list = [
             {
-                "id": friend.friend.id if friend.user == request.user else friend.user.id,
-                "username": friend.friend.username if friend.user == request.user else friend.user.username,
-                "first_name": friend.friend.first_name if friend.user == request.user else friend.user.first_name,
-                "last_name": friend.friend.last_name if friend.user == request.user else friend.user.last_name,
-                "profile_picture": friend.friend.profile_picture if friend.user == request.user else friend.user.profile_picture
+                "id": friend.id,
+                "username": friend.username,
+                "first_name": friend.first_name,
+                "last_name": friend.last_name,
+                "profile_picture": friend.profile_picture.url if friend.profile_picture else None
             }
-            for friend in friends
+            for friend in get_friends(request.user.id)
         ]
 
         return Response(friend_list, status=status.HTTP_200_OK)
     
 class RemoveFriendView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def delete(self, request, friend_id):
         """Remove a friend from the authenticated user's friend list"""
         user = request.user
-        friendship = Friendship.objects.filter(
-            (models.Q(user=user, friend_id=friend_id) | models.Q(user_id=friend_id, friend=user)),
-            status="Accepted"
-        ).first()
-
-        if not friendship:
+        if not are_friends(user.id, friend_id):
             return Response({"error": "Friendship not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        friendship.delete()
+        Friendship.objects.between(user.id, friend_id).filter(status="Accepted").delete()
+        invalidate_friends(user.id, friend_id)
         return Response({"message": "Friend removed successfully."}, status=status.HTTP_200_OK)
     
 class ViewFriendshipDetailsView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request):
         """View friendship details of the logged-in user."""
-        friendships = Friendship.objects.filter(models.Q(user=request.user) | models.Q(friend=request.user))
+        friendships = Friendship.objects.involving(request.user.id).select_related('requester')
         serializer = FriendshipSerializer(friendships, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 class ViewFriendRequestsView(APIView):
-    authentication_classes = [JWTAuthentication]  # Enforce JWT authentication
+    authentication_classes = [StatelessJWTAuthentication]  # Enforce JWT authentication
     permission_classes = [IsAuthenticated]  # Require authentication
 
     def get(self, request):
         """List all pending friend requests received by the authenticated user."""
-        friend_requests = Friendship.objects.filter(friend=request.user, status="Pending")
+        friend_requests = Friendship.objects.involving(request.user.id).filter(
+            status="Pending"
+        ).exclude(requester_id=request.user.id).select_related('requester')
         serializer = FriendshipSerializer(friend_requests, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class FriendRoutineView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, friend_id):
@@ -168,20 +217,14 @@ class FriendRoutineView(APIView):
         """
         try:
             # Verify friendship exists and is accepted
-            friendship = Friendship.objects.filter(
-                (models.Q(user=request.user, friend_id=friend_id) | 
-                 models.Q(friend=request.user, user_id=friend_id)),
-                status="Accepted"
-            ).first()
-
-            if not friendship:
+            if not are_friends(request.user.id, friend_id):
                 return Response(
                     {"error": "You are not friends with this user or friendship not accepted"},
                     status=status.HTTP_403_FORBIDDEN
                 )
 
             # Get the friend's user object
-            friend = friendship.friend if friendship.user == request.user else friendship.user
+            friend = User.objects.get(id=friend_id)
 
             # Get the friend's primary routine
             user_routine = UserRoutine.objects.select_related('routine').filter(